@@ -1,12 +1,20 @@
-from typing import Dict, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 def two_sided_context_hellings(
     grammar: Dict[str, List[List[str]]],
     left_context: Dict[str, Set[str]],
     right_context: Dict[str, Set[str]],
-    input_string: str
+    input_string: str,
+    semi_naive: bool = False,
+    stats: Optional[List[Dict[str, int]]] = None
 ) -> bool:
-    """Hellings-style relational algebra implementation of two-sided context CYK."""
+    """Hellings-style relational algebra implementation of two-sided context CYK.
+
+    With semi_naive, each round joins only the pairs derived in the previous
+    round against the accumulated relations (dB.C | B.dC) instead of
+    recomposing every rule from scratch, and stops when every delta is empty.
+    If stats is a list, one {nonterminal: new pairs} dict is appended per round.
+    """
     n = len(input_string)
     if n == 0:
         return False
@@ -37,10 +45,25 @@ def two_sided_context_hellings(
         L[A] = N[A].copy()
         R[A] = N[A].copy()
 
+    def left_ok(A: str, i: int) -> bool:
+        return not left_context.get(A) or any(
+            (m, i) in L[lc] for lc in left_context[A] for m in range(i)
+        )
+
+    def right_ok(A: str, k: int) -> bool:
+        return not right_context.get(A) or any(
+            (k, m) in R[rc] for rc in right_context[A] for m in range(k, n+1)
+        )
+
+    if semi_naive:
+        _semi_naive_rounds(grammar, N, L, R, left_ok, right_ok, stats)
+        return (0, n) in N['S']
+
     # Main algorithm
     changed = True
     while changed:
         changed = False
+        before = {A: len(N[A]) for A in grammar}
         for A, prods in grammar.items():
             for prod in prods:
                 if len(prod) == 2:  # A → BC
@@ -54,13 +77,13 @@ def two_sided_context_hellings(
                     if left_context.get(A):
                         new_pairs = {
                             (i, k) for (i, k) in new_pairs
-                            if any((m, i) in L[lc] for lc in left_context[A] for m in range(i))
+                            if left_ok(A, i)
                         }
                     # Apply right context
                     if right_context.get(A):
                         new_pairs = {
                             (i, k) for (i, k) in new_pairs
-                            if any((k, m) in R[rc] for rc in right_context[A] for m in range(k, n+1))
+                            if right_ok(A, k)
                         }
                     # Update N_A
                     prev_size = len(N[A])
@@ -70,5 +93,55 @@ def two_sided_context_hellings(
                         # Update context relations
                         L[A].update((i, j) for (i, j) in new_pairs)
                         R[A].update((i, j) for (i, j) in new_pairs)
+        if stats is not None:
+            stats.append({A: len(N[A]) - before[A] for A in grammar})
 
     return (0, n) in N['S']
+
+
+def _semi_naive_rounds(grammar, N, L, R, left_ok, right_ok, stats) -> None:
+    # Joins go through per-position indexes of N. A candidate rejected by a
+    # context check is kept and retried every round, since the context
+    # relations L and R keep growing.
+    starting = {A: {} for A in grammar}  # starting[A][i]: the k with (i, k) in N[A]
+    ending = {A: {} for A in grammar}  # ending[A][k]: the i with (i, k) in N[A]
+
+    def index(A, pairs):
+        for (i, k) in pairs:
+            starting[A].setdefault(i, set()).add(k)
+            ending[A].setdefault(k, set()).add(i)
+
+    for A in grammar:
+        index(A, N[A])
+    delta = {A: set(N[A]) for A in grammar}
+    rejected = {A: set() for A in grammar}
+    while any(delta.values()) or any(rejected.values()):
+        new = {A: set() for A in grammar}
+        for A, prods in grammar.items():
+            candidates = set(rejected[A])
+            for prod in prods:
+                if len(prod) == 2:  # A → BC
+                    B, C = prod
+                    candidates.update(
+                        (i, k) for (i, j) in delta.get(B, ()) for k in starting.get(C, {}).get(j, ())
+                    )
+                    candidates.update(
+                        (i, k) for (j, k) in delta.get(C, ()) for i in ending.get(B, {}).get(j, ())
+                    )
+            candidates -= N[A]
+            rejected[A] = set()
+            for (i, k) in candidates:
+                if left_ok(A, i) and right_ok(A, k):
+                    new[A].add((i, k))
+                else:
+                    rejected[A].add((i, k))
+        if not any(new.values()):
+            break  # the contexts did not grow, the rejected pairs stay rejected
+        for A in grammar:
+            N[A].update(new[A])
+            L[A].update(new[A])
+            R[A].update(new[A])
+            index(A, new[A])
+        delta = new
+        if stats is not None:
+            stats.append({A: len(new[A]) for A in grammar})
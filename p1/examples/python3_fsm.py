@@ -1,19 +1,19 @@
-def recognize(string, machine, acceptStates):
-        index = 0 # Beginning of tape
+def print_transition(prevState, symbol, currentState):
+        print("Transition to state:", currentState,"from state", prevState, "by reading", symbol)
+
+def recognize(string, machine, acceptStates, trace=None):
+        # trace, if given, is called as trace(prevState, symbol, currentState)
+        # on every transition; see transform/recognize.py for streaming and
+        # batch recognizers over faio automata
         currentState = 0 # Initial state of machine
-        while True:
-                if index == len(string):
-                        if currentState in acceptStates:
-                                return True
-                        else:
-                                return False
-                elif string[index] in machine[currentState].keys():
-                        prevState = currentState
-                        currentState = machine[currentState][string[index]]
-                        print("Transition to state:", currentState,"from state", prevState, "by reading", string[index])
-                        index+=1
-                else:
+        for symbol in string:
+                nextState = machine[currentState].get(symbol)
+                if nextState is None:
                         return False
+                if trace is not None:
+                        trace(currentState, symbol, nextState)
+                currentState = nextState
+        return currentState in acceptStates
 
 stateTranTable = {0:{"l":1}, 1:{"n":1,"!":2}, 2:{}}
-print(recognize("l!",stateTranTable, [2]))
+print(recognize("l!",stateTranTable, [2], trace=print_transition))
@@ -0,0 +1,100 @@
+from array import array
+
+import faio
+
+# Alphabet compression: letters that no transition can tell apart (same
+# successor sets from every state) form one class, and the automaton is
+# rewritten over class ids. Determinization, minimization and product
+# constructions keep such letters equivalent, so they can run on the
+# compressed automaton and the result is expanded back at the end.
+
+
+def letter_classes(fa):
+    # members: list of classes (lists of letter ids in alphabet order),
+    # class_of[a]: class id of letter a
+    fa = faio.FA.of(fa)
+    signature = [[] for _ in fa.letters]
+    for q, row in enumerate(fa.succ):
+        for a, dsts in row.items():
+            signature[a].append((q, tuple(sorted(dsts))))
+    classes = {}
+    class_of = []
+    members = []
+    for a in range(len(fa.letters)):
+        key = tuple(signature[a]) # states are visited in order, no sort needed
+        if key not in classes:
+            classes[key] = len(members)
+            members.append([])
+        class_of.append(classes[key])
+        members[classes[key]].append(a)
+    return members, class_of
+
+
+def compress(fa):
+    # (compressed FA, members): the compressed FA has one letter per class,
+    # named after its first member; members maps class id -> letter names
+    fa = faio.FA.of(fa)
+    members, class_of = letter_classes(fa)
+    names = [[fa.letters[a] for a in m] for m in members]
+    res = faio.FA(fa.states, [m[0] for m in names])
+    res.start = list(fa.start)
+    res.final = bytearray(fa.final)
+    for q, row in enumerate(fa.succ):
+        for a, dsts in row.items():
+            if members[class_of[a]][0] == a:
+                for p in dsts:
+                    res.add_transition(q, class_of[a], p)
+    for q, p in fa.eps_transitions():
+        res.add_eps(q, p)
+    if res.is_deterministic():
+        res.compile_table()
+    return res, names
+
+
+def expand(fa, names, letters=None):
+    # inverse of compress: every class letter becomes all of its members;
+    # letters gives the order of the expanded alphabet (default: by class)
+    fa = faio.FA.of(fa)
+    res = faio.FA(fa.states, letters or [x for m in names for x in m])
+    res.start = list(fa.start)
+    res.final = bytearray(fa.final)
+    for q, c, p in fa.transitions():
+        for letter in names[c]:
+            res.add_transition(q, res.letter_id[letter], p)
+    for q, p in fa.eps_transitions():
+        res.add_eps(q, p)
+    if res.is_deterministic():
+        res.compile_table()
+    return res
+
+
+def over_classes(fa, fn):
+    # runs fn (FA -> FA) on the compressed automaton and expands the result
+    fa = faio.FA.of(fa)
+    cfa, names = compress(fa)
+    if len(names) == len(fa.letters):
+        return fn(fa) # nothing to compress
+    return expand(fn(cfa), names, fa.letters)
+
+
+def char_class_map(fa, size=256):
+    # code point -> class id for single-character letters, for a 256-entry
+    # (bytes) or 65536-entry (BMP text) lookup; everything else, including
+    # multi-character letters, maps to the extra class len(members)
+    members, class_of = letter_classes(fa)
+    other = len(members)
+    res = array('B' if other < 256 else 'H', [other]) * size
+    for a, letter in enumerate(fa.letters):
+        if len(letter) == 1 and ord(letter) < size:
+            res[ord(letter)] = class_of[a]
+    return res, members
+
+
+if __name__ == "__main__":
+    # usage: alphabet.py <in.json|in.fab> <out.json|out.fab>: write the compressed automaton
+    fa = faio.FA.of(faio.load_fa())
+    cfa, names = compress(fa)
+    print("letters: %d, classes: %d" % (len(fa.letters), len(names)))
+    for c, m in enumerate(names):
+        print(c, m)
+    faio.out_fa(cfa)
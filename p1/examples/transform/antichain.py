@@ -0,0 +1,163 @@
+import sys
+from collections import deque
+
+import faio
+import nfa2dfa
+import simulation
+
+# Antichain algorithms (De Wulf, Doyen, Henzinger, Raskin) for universality
+# and language inclusion of NFAs without determinizing them. The subset
+# construction is explored breadth-first, but a macrostate is dropped when
+# an already found one is "smaller": whatever word leads the bigger one to
+# rejection leads the smaller one there as well. Only the minimal elements
+# (an antichain) are kept. With use_simulation, "smaller" is relaxed from
+# subset inclusion to the forward simulation preorder, and macrostates are
+# shrunk to their simulation-maximal states, which prunes much more.
+# Both checks return None on success or a counterexample word; it is found
+# breadth-first, but may be longer than the shortest one when a pruned
+# macrostate was on the shortest path.
+
+
+class Antichain(object):
+    """
+    BFS over (key, macrostate) elements with parent links for the witness.
+    covers(x, y) says that element x makes y redundant; an element is
+    added only if no kept one covers it, and then removes those it covers.
+    """
+    def __init__(self, covers):
+        self.covers = covers
+        self.items = [] # (element, parent index, letter)
+        self.alive = []
+        self.kept = []
+        self.worklist = deque()
+
+    def add(self, element, parent=None, letter=None):
+        for i in self.kept:
+            if self.covers(self.items[i][0], element):
+                return None
+        res = len(self.items)
+        kept = []
+        for i in self.kept:
+            if self.covers(element, self.items[i][0]):
+                self.alive[i] = False
+            else:
+                kept.append(i)
+        self.kept = kept
+        self.kept.append(res)
+        self.items.append((element, parent, letter))
+        self.alive.append(True)
+        self.worklist.append(res)
+        return res
+
+    def pop(self):
+        # next element still in the antichain, None when done
+        while self.worklist:
+            i = self.worklist.popleft()
+            if self.alive[i]:
+                return i
+        return None
+
+    def word(self, i):
+        res = []
+        while self.items[i][1] is not None:
+            _, i, letter = self.items[i]
+            res.append(letter)
+        return res[::-1]
+
+
+def universality_witness(nfa, use_simulation=False):
+    # None iff the NFA accepts every word over its alphabet
+    fa = nfa2dfa.remove_epsilon(nfa)
+    step, finals, start = nfa2dfa.subset_steps(fa)
+    if use_simulation:
+        up = simulation.forward_simulation(fa)
+        shrink = lambda mask: simulation.maximal_states(up, mask)
+        covers = lambda small, big: simulation.simulates(up, big, small)
+    else:
+        shrink = lambda mask: mask
+        covers = lambda small, big: small & big == small
+
+    chain = Antichain(covers)
+    if not start & finals:
+        return []
+    chain.add(shrink(start))
+    while True:
+        i = chain.pop()
+        if i is None:
+            return None
+        mask = chain.items[i][0]
+        for a, letter in enumerate(fa.letters):
+            nxt = nfa2dfa.post(step, mask, a)
+            if not nxt & finals:
+                return chain.word(i) + [letter]
+            chain.add(shrink(nxt), i, letter)
+
+
+def disjoint_union(fa1, fa2):
+    # (FA with the states of fa1 and then of fa2, offset of fa2's states);
+    # letters are merged by name, there are no start states
+    fa1 = nfa2dfa.remove_epsilon(fa1)
+    fa2 = nfa2dfa.remove_epsilon(fa2)
+    letters = fa1.letters + [x for x in fa2.letters if x not in fa1.letter_id]
+    offset = len(fa1.states)
+    res = faio.FA(['1:' + s for s in fa1.states] + ['2:' + s for s in fa2.states], letters)
+    res.final = fa1.final + fa2.final
+    for q, a, p in fa1.transitions():
+        res.add_transition(q, a, p)
+    for q, a, p in fa2.transitions():
+        res.add_transition(offset + q, res.letter_id[fa2.letters[a]], offset + p)
+    return res, [q for q in fa1.start], [offset + q for q in fa2.start]
+
+
+def inclusion_witness(fa1, fa2, use_simulation=False):
+    # None iff L(fa1) is a subset of L(fa2), otherwise a word of
+    # L(fa1) - L(fa2). Elements are pairs (state of fa1, macrostate of fa2),
+    # both in the numbering of the disjoint union.
+    fa, start1, start2 = disjoint_union(faio.FA.of(fa1), faio.FA.of(fa2))
+    step, finals, _ = nfa2dfa.subset_steps(fa) # the union has no start states
+    if use_simulation:
+        up = simulation.forward_simulation(fa)
+        shrink = lambda mask: simulation.maximal_states(up, mask)
+        covers = lambda small, big: (up[big[0]] >> small[0] & 1) and simulation.simulates(up, big[1], small[1])
+    else:
+        shrink = lambda mask: mask
+        covers = lambda small, big: small[0] == big[0] and small[1] & big[1] == small[1]
+
+    def rejects(p, mask):
+        return fa.final[p] and not mask & finals
+
+    chain = Antichain(covers)
+    start = 0
+    for q in start2:
+        start |= 1 << q
+    for p in start1:
+        if rejects(p, start):
+            return []
+        chain.add((p, shrink(start)))
+    while True:
+        i = chain.pop()
+        if i is None:
+            return None
+        p, mask = chain.items[i][0]
+        for a, letter in enumerate(fa.letters):
+            nxt = nfa2dfa.post(step, mask, a)
+            for p2 in fa.successors(p, a):
+                if rejects(p2, nxt):
+                    return chain.word(i) + [letter]
+                chain.add((p2, shrink(nxt)), i, letter)
+
+
+if __name__ == "__main__":
+    # usage: antichain.py <A> universal [sim]
+    #        antichain.py <A> <B> [sim]: is L(A) a subset of L(B)?
+    if len(sys.argv) <= 2:
+        print("Input is incorrect")
+        sys.exit(1)
+    use_simulation = sys.argv[-1] == 'sim'
+    fa1 = faio.load_fa(sys.argv[1])
+    if sys.argv[2] == 'universal':
+        word = universality_witness(fa1, use_simulation)
+        print("L(A) is universal" if word is None else "rejected word: %r" % ''.join(word))
+    else:
+        word = inclusion_witness(fa1, faio.load_fa(sys.argv[2]), use_simulation)
+        print("L(A) <= L(B)" if word is None else "in A, not in B: %r" % ''.join(word))
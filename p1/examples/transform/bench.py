@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import faio
+import fagen
+import mindfa
+import nfa2dfa
+
+
+def measure(fn, *args):
+    # (result, seconds, peak bytes allocated by Python while fn ran). fn is
+    # run twice: timed on its own, then again under tracemalloc for the
+    # peak, since tracing slows allocation-heavy code down unevenly.
+    t = time.perf_counter()
+    res = fn(*args)
+    elapsed = time.perf_counter() - t
+    tracemalloc.start()
+    try:
+        fn(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return res, elapsed, peak
+
+
+def json_roundtrip(fa):
+    text = json.dumps(fa.to_json(), indent=4)
+    return faio.FA.from_json(json.loads(text)), len(text)
+
+
+def binary_roundtrip(fa):
+    fd, path = tempfile.mkstemp(suffix=faio.BINARY_SUFFIX)
+    os.close(fd)
+    try:
+        faio.save_binary(fa, path)
+        size = os.path.getsize(path)
+        fa = faio.load_binary(path)
+        return len(fa.states), size
+    finally:
+        os.remove(path)
+
+
+def io_case(name, fa, kind):
+    case = {'name': name, kind + '_states': len(fa.states), 'letters': len(fa.letters),
+            kind + '_transitions': sum(1 for _ in fa.transitions())}
+    (_, size), case['json_io_s'], case['json_io_peak'] = measure(json_roundtrip, fa)
+    case['json_bytes'] = size
+    (_, size), case['binary_io_s'], case['binary_io_peak'] = measure(binary_roundtrip, fa)
+    case['binary_bytes'] = size
+    return case
+
+
+def run_case(name, nfa, max_states, shards=()):
+    case = io_case(name, nfa, 'nfa')
+    try:
+        dfa, case['determinize_s'], case['determinize_peak'] = measure(nfa2dfa.determinize, nfa, max_states)
+    except nfa2dfa.StateBudgetExceeded:
+        case['determinize'] = 'state budget exceeded'
+        return case
+    case['dfa_states'] = len(dfa.states)
+    if shards:
+        case['shard_imbalance'] = shard_imbalance(nfa, shards)
+    run_minimize(case, dfa)
+    return case
+
+
+def shard_imbalance(nfa, shards):
+    # largest shard of determinize_parallel over the mean, per shard count
+    res = {}
+    for w in shards:
+        counts = nfa2dfa.shard_sizes(nfa, w)
+        res[str(w)] = round(max(counts) * w / max(sum(counts), 1), 3)
+    return res
+
+
+def run_dfa_case(name, dfa):
+    # random DFAs go straight to minimization, which then runs at their size
+    case = io_case(name, dfa, 'dfa')
+    run_minimize(case, dfa)
+    return case
+
+
+def run_minimize(case, dfa):
+    mdfa, case['minimize_s'], case['minimize_peak'] = measure(mindfa.hopcroft_minimise, dfa)
+    case['min_dfa_states'] = len(mdfa.states)
+
+
+def cases(args):
+    # (name, automaton, is it a DFA)
+    for n in args.states:
+        for k in args.letters:
+            for i in range(args.repeat):
+                seed = args.seed + i
+                name = 'random n=%d k=%d density=%g nondet=%d seed=%d' % (n, k, args.density, args.nondet, seed)
+                yield name, fagen.random_nfa(n, k, args.density, args.nondet, seed), False
+    for n in args.nth:
+        yield 'nth_from_end n=%d' % n, fagen.nth_from_end(n), False
+    for n in args.dfa_states:
+        for k in args.letters:
+            for i in range(args.repeat):
+                seed = args.seed + i
+                yield 'random_dfa n=%d k=%d seed=%d' % (n, k, seed), fagen.random_dfa(n, k, seed=seed), True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark for the FA transform pipeline")
+    parser.add_argument('--states', type=int, nargs='*', default=[10, 20, 40, 80])
+    parser.add_argument('--letters', type=int, nargs='*', default=[2])
+    parser.add_argument('--density', type=float, default=0.5)
+    parser.add_argument('--nondet', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help="random automata per (states, letters)")
+    parser.add_argument('--nth', type=int, nargs='*', default=[4, 8, 12], help="n-th letter from the end sizes")
+    parser.add_argument('--dfa-states', type=int, nargs='*', default=[10000, 100000],
+                        help="random complete DFA sizes, minimized directly")
+    parser.add_argument('--shards', type=int, nargs='*', default=[2, 4, 8],
+                        help="shard counts to check the determinize_parallel spread for")
+    parser.add_argument('--max-imbalance', type=float, default=1.25,
+                        help="largest shard over the mean allowed for DFAs of 1000+ states")
+    parser.add_argument('--max-states', type=int, default=200000, help="determinization state budget")
+    parser.add_argument('--out', default='bench_report.json')
+    args = parser.parse_args()
+
+    status = 0
+    report = {'python': platform.python_version(), 'machine': platform.machine(),
+              'args': vars(args), 'cases': []}
+    for name, fa, is_dfa in cases(args):
+        case = run_dfa_case(name, fa) if is_dfa else run_case(name, fa, args.max_states, args.shards)
+        print(json.dumps(case))
+        report['cases'].append(case)
+        if case.get('dfa_states', 0) >= 1000 and not is_dfa:
+            for w, ratio in case['shard_imbalance'].items():
+                if ratio > args.max_imbalance:
+                    print("unbalanced shards: %s, %s workers: %g" % (name, w, ratio))
+                    status = 1
+
+    with open(args.out, 'w') as out:
+        out.write(json.dumps(report, indent=4))
+    sys.exit(status)
@@ -0,0 +1,199 @@
+import sys
+
+import alphabet
+import faio
+
+# Compiles a (minimised) DFA into a standalone recognizer: a Python module
+# with a flat table-driven loop over bytes or with direct-coded branches, or a
+# C source in the style of simple_fsm/dfa.c. The generated code needs neither
+# faio nor the JSON file at run time.
+# Letters must be single characters with codes below 256: they are matched
+# against input bytes, str input is encoded as latin-1.
+
+
+def byte_classes(fa):
+    # (byte -> alphabet class id, the classes' representative letter ids);
+    # bytes outside the alphabet map to the extra class len(representatives)
+    for letter in fa.letters:
+        if len(letter) != 1 or ord(letter) > 255:
+            raise ValueError("letter %r is not a single 8-bit character" % letter)
+    classes, members = alphabet.char_class_map(fa, 256)
+    return list(classes), [m[0] for m in members]
+
+
+def prepare(fa):
+    fa = faio.FA.of(fa)
+    if not fa.is_deterministic():
+        raise ValueError("automaton is not deterministic, run nfa2dfa first")
+    fa.compile_table()
+    return fa
+
+
+def byte_ranges(fa, q, classes, reps):
+    # [(lo, hi, target)] runs of consecutive bytes going to the same state
+    ranges = []
+    for b in range(256):
+        c = classes[b]
+        p = fa.delta(q, reps[c]) if c < len(reps) else -1
+        if p < 0:
+            continue
+        if ranges and ranges[-1][1] == b - 1 and ranges[-1][2] == p:
+            ranges[-1][1] = b
+        else:
+            ranges.append([b, b, p])
+    return ranges
+
+
+def condition(lo, hi):
+    if lo == hi:
+        return "b == %d" % lo
+    return "%d <= b <= %d" % (lo, hi)
+
+
+def header(fa, source):
+    lines = ["# Generated by dfa2src.py from %s, do not edit." % source]
+    for q, name in enumerate(fa.states):
+        lines.append("# state %d: %s%s" % (q, name, " (final)" if fa.final[q] else ""))
+    return lines
+
+
+def python_table(fa, source='DFA'):
+    # one column per alphabet class
+    classes, reps = byte_classes(fa)
+    width = len(reps) + 1 # the last column is "outside the alphabet", always -1
+    table = []
+    for q in range(len(fa.states)):
+        table += [fa.delta(q, a) for a in reps] + [-1]
+    lines = header(fa, source)
+    lines += [
+        "from array import array",
+        "",
+        "START = %d" % (fa.start[0] if fa.start else -1),
+        "WIDTH = %d" % width,
+        "CLASS = %r" % bytes(classes),
+        "TABLE = array('i', %r)" % table,
+        "ACCEPT = %r" % bytes(fa.final),
+        "",
+        "",
+        "def match(data):",
+        "    if isinstance(data, str):",
+        "        data = data.encode('latin-1')",
+        "    s = START",
+        "    table = TABLE",
+        "    cls = CLASS",
+        "    for b in data:",
+        "        if s < 0:",
+        "            return False",
+        "        s = table[s * WIDTH + cls[b]]",
+        "    return s >= 0 and ACCEPT[s] == 1",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def python_direct(fa, source='DFA'):
+    classes, reps = byte_classes(fa)
+    lines = header(fa, source)
+    lines += [
+        "def match(data):",
+        "    if isinstance(data, str):",
+        "        data = data.encode('latin-1')",
+        "    s = %d" % (fa.start[0] if fa.start else -1),
+        "    for b in data:",
+    ]
+    keyword = "if"
+    for q in range(len(fa.states)):
+        lines.append("        %s s == %d:" % (keyword, q))
+        keyword = "elif"
+        branch = "if"
+        for lo, hi, p in byte_ranges(fa, q, classes, reps):
+            lines.append("            %s %s:" % (branch, condition(lo, hi)))
+            lines.append("                s = %d" % p)
+            branch = "elif"
+        if branch == "if":
+            lines.append("            return False")
+        else:
+            lines.append("            else:")
+            lines.append("                return False")
+    if keyword == "if": # no states at all
+        lines.append("        return False")
+    else:
+        lines.append("        else:")
+        lines.append("            return False")
+    finals = [q for q in range(len(fa.states)) if fa.final[q]]
+    lines.append("    return s in %r" % (set(finals) if finals else set()))
+    return "\n".join(lines) + "\n"
+
+
+def c_source(fa, source='DFA'):
+    n = len(fa.states)
+    classes, reps = byte_classes(fa)
+    k = len(reps)
+    lines = ["// " + line[2:] for line in header(fa, source)]
+    lines += [
+        "#include <stdio.h>",
+        "#include <stdlib.h>",
+        "",
+        "#define BUFSIZE 4096",
+        "",
+        # C has no empty enums, q_none stands in when there are no states
+        "enum states {%s};" % (", ".join("q%d" % q for q in range(n)) or "q_none"),
+        "enum { no_state = -1, n_sym = %d };" % k,
+        "",
+        "// byte -> symbol (alphabet class), n_sym for bytes outside the alphabet",
+        "static const unsigned char sym_of[256] = {%s};" % ", ".join(map(str, classes)),
+        "",
+        "static const int accepting[%d] = {%s};" % (max(n, 1), ", ".join(str(f) for f in fa.final) or "0"),
+        "",
+        "// FSM_table[state][sym] is the new state, no_state if there is no transition",
+        "static const int FSM_table[%d][%d] = {" % (max(n, 1), k + 1),
+    ]
+    for q in range(n):
+        row = ["q%d" % fa.delta(q, a) if fa.delta(q, a) >= 0 else "no_state" for a in reps]
+        lines.append("    [q%d] = {%s, no_state}," % (q, ", ".join(row)))
+    if not n: # nor empty initializers, the dummy row is never read
+        lines.append("    {%s}," % ", ".join(["no_state"] * (k + 1)))
+    lines += [
+        "};",
+        "",
+        "int match(const unsigned char *s)",
+        "{",
+        "    int current_state = %s;" % ("q%d" % fa.start[0] if fa.start else "no_state"),
+        "    for (; *s && current_state != no_state; s++)",
+        "        current_state = FSM_table[current_state][sym_of[*s]];",
+        "    return current_state != no_state && accepting[current_state];",
+        "}",
+        "",
+        "int main()",
+        "{",
+        "    char test_buf[BUFSIZE];",
+        "    while (scanf(\"%4095s\", test_buf) == 1)",
+        "        printf(\"%s: %s\\n\", test_buf, match((const unsigned char *)test_buf) ? \"accepted\" : \"not accepted\");",
+        "    return 0;",
+        "}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+GENERATORS = {
+    'table': python_table,
+    'direct': python_direct,
+    'c': c_source,
+}
+
+
+def compile_dfa(fa, mode='table', source='DFA'):
+    return GENERATORS[mode](prepare(fa), source)
+
+
+if __name__ == "__main__":
+    # usage: dfa2src.py <dfa.json|dfa.fab> <out.py|out.c> [table|direct]
+    if len(sys.argv) <= 2:
+        print("Input is incorrect")
+        sys.exit(1)
+    mode = 'c' if sys.argv[2].endswith('.c') else (sys.argv[3] if len(sys.argv) > 3 else 'table')
+    if mode not in GENERATORS:
+        print("Unknown mode:", mode)
+        sys.exit(1)
+    code = compile_dfa(faio.load_dfa(), mode, sys.argv[1])
+    with open(sys.argv[2], 'w') as out:
+        out.write(code)
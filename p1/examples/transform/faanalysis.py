@@ -0,0 +1,122 @@
+import faio
+
+
+def adjacency(fa, reverse=False):
+    # successor (or predecessor) lists over all letters and epsilon, built in
+    # one pass over the transitions; duplicates across letters are kept
+    adj = [[] for _ in fa.states]
+    for q, a, p in fa.transitions():
+        if reverse:
+            adj[p].append(q)
+        else:
+            adj[q].append(p)
+    for q, p in fa.eps_transitions():
+        if reverse:
+            adj[p].append(q)
+        else:
+            adj[q].append(p)
+    return adj
+
+
+def reachable_from(adj, sources):
+    # iterative DFS, returns a bytearray of flags
+    seen = bytearray(len(adj))
+    stack = []
+    for q in sources:
+        if not seen[q]:
+            seen[q] = 1
+            stack.append(q)
+    while stack:
+        q = stack.pop()
+        for p in adj[q]:
+            if not seen[p]:
+                seen[p] = 1
+                stack.append(p)
+    return seen
+
+
+def forward_reachable(fa):
+    return reachable_from(adjacency(fa), fa.start)
+
+
+def backward_reachable(fa):
+    # states from which some final state can be reached
+    finals = [q for q in range(len(fa.states)) if fa.final[q]]
+    return reachable_from(adjacency(fa, reverse=True), finals)
+
+
+def useful_states(fa):
+    fwd = forward_reachable(fa)
+    bwd = backward_reachable(fa)
+    return bytearray(f & b for f, b in zip(fwd, bwd))
+
+
+def trim(fa):
+    # drops unreachable and dead (useless) states; a trimmed DFA is partial
+    fa = faio.FA.of(fa)
+    keep = useful_states(fa)
+    return fa if all(keep) else fa.restrict(keep)
+
+
+def tarjan_scc(adj):
+    # Iterative Tarjan. Returns (comp, comps): comp[q] is the SCC number of q,
+    # comps lists the members of every SCC. SCCs are numbered in reverse
+    # topological order, i.e. every edge goes to the same or a smaller number.
+    n = len(adj)
+    index = [-1] * n
+    low = [0] * n
+    on_stack = bytearray(n)
+    comp = [-1] * n
+    comps = []
+    stack = []
+    counter = 0
+    for s in range(n):
+        if index[s] >= 0:
+            continue
+        work = [(s, 0)]
+        while work:
+            q, i = work.pop()
+            if i == 0:
+                index[q] = low[q] = counter
+                counter += 1
+                stack.append(q)
+                on_stack[q] = 1
+            succ = adj[q]
+            while i < len(succ):
+                p = succ[i]
+                i += 1
+                if index[p] < 0:
+                    work.append((q, i))
+                    work.append((p, 0))
+                    break
+                if on_stack[p] and index[p] < low[q]:
+                    low[q] = index[p]
+            else:
+                if low[q] == index[q]:
+                    members = []
+                    while True:
+                        p = stack.pop()
+                        on_stack[p] = 0
+                        comp[p] = len(comps)
+                        members.append(p)
+                        if p == q:
+                            break
+                    comps.append(members)
+                if work:
+                    parent = work[-1][0]
+                    if low[q] < low[parent]:
+                        low[parent] = low[q]
+    return comp, comps
+
+
+def fa_scc(fa):
+    return tarjan_scc(adjacency(fa))
+
+
+if __name__ == "__main__":
+    # usage: faanalysis.py <in.json|in.fab> <out.json|out.fab>: trim the automaton
+    fa = faio.FA.of(faio.load_fa())
+    res = trim(fa)
+    comp, comps = fa_scc(res)
+    print("states: %d, useful: %d, SCCs: %d" % (len(fa.states), len(res.states), len(comps)))
+    faio.out_fa(res)
@@ -0,0 +1,176 @@
+import os
+import subprocess
+import sys
+from collections import deque
+
+import faanalysis
+import faio
+
+# Streaming DOT writer: lines go straight to the output (a file or the stdin
+# of Graphviz's dot), one state at a time, without building pydot objects.
+# Parallel edges q -> p are merged into one edge labelled with a character
+# class such as [a-z0-9_]. For huge automata draw only a bounded view: the
+# BFS neighbourhood of the start state, or the graph of SCCs.
+
+MAX_LABEL = 40
+
+
+def quote(s):
+    return '"%s"' % str(s).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def class_label(letters):
+    # merged edge label: runs of 3+ consecutive characters become ranges
+    if any(len(x) != 1 for x in letters):
+        label = ','.join(letters)
+    else:
+        codes = sorted(set(ord(x) for x in letters))
+        parts = []
+        i = 0
+        while i < len(codes):
+            j = i
+            while j + 1 < len(codes) and codes[j + 1] == codes[j] + 1:
+                j += 1
+            if j - i >= 2:
+                parts.append('%s-%s' % (chr(codes[i]), chr(codes[j])))
+            else:
+                parts.extend(chr(c) for c in codes[i:j + 1])
+            i = j + 1
+        label = ''.join(parts)
+        if len(parts) > 1:
+            label = '[%s]' % label
+    if len(label) > MAX_LABEL:
+        label = label[:MAX_LABEL - 3] + '...'
+    return label
+
+
+def targets(fa, q):
+    # {p: [letter names]} for the edges leaving q; epsilon is 'ε'
+    res = {}
+    if fa.table is not None: # DFA row, without building succ
+        k = len(fa.letters)
+        for a in range(k):
+            p = fa.table[q * k + a]
+            if p >= 0:
+                res.setdefault(p, []).append(fa.letters[a])
+    else:
+        for a, dsts in fa.succ[q].items():
+            for p in dsts:
+                res.setdefault(p, []).append(fa.letters[a])
+    for p in fa.eps[q]:
+        res.setdefault(p, []).append('ε')
+    return res
+
+
+def bfs_view(fa, max_states=100):
+    # keep flags of the first max_states states in BFS order from the start
+    keep = bytearray(len(fa.states))
+    worklist = deque()
+    count = 0
+    for q in fa.start:
+        if not keep[q] and count < max_states:
+            keep[q] = 1
+            count += 1
+            worklist.append(q)
+    while worklist and count < max_states:
+        q = worklist.popleft()
+        for p in targets(fa, q):
+            if not keep[p] and count < max_states:
+                keep[p] = 1
+                count += 1
+                worklist.append(p)
+    return keep
+
+
+def write_header(out):
+    out.write('digraph my_graph {\nrankdir=LR;\n')
+    out.write('start [shape=point, label=""];\n')
+
+
+def write_dot(fa, out, keep=None):
+    # the whole automaton, or only the states with keep[q] set; edges
+    # leaving the view end in one dashed "..." node
+    fa = faio.FA.of(fa)
+    write_header(out)
+    cut = False
+    for q, name in enumerate(fa.states):
+        if keep is None or keep[q]:
+            out.write('%d [label=%s, shape=%s];\n' % (q, quote(name), 'doublecircle' if fa.final[q] else 'circle'))
+    for q in fa.start:
+        if keep is None or keep[q]:
+            out.write('start -> %d [color=blue];\n' % q)
+    for q in range(len(fa.states)):
+        if keep is not None and not keep[q]:
+            continue
+        outside = False
+        for p, letters in targets(fa, q).items():
+            if keep is None or keep[p]:
+                out.write('%d -> %d [label=%s];\n' % (q, p, quote(class_label(letters))))
+            else:
+                outside = True
+        if outside:
+            if not cut:
+                cut = True
+                out.write('more [label="...", shape=none];\n')
+            out.write('%d -> more [style=dashed];\n' % q)
+    out.write('}\n')
+
+
+def write_condensed(fa, out):
+    # one node per SCC (its state name if it is a single state, otherwise
+    # the state count), double border if it holds a final state
+    fa = faio.FA.of(fa)
+    comp, comps = faanalysis.fa_scc(fa)
+    write_header(out)
+    for c, members in enumerate(comps):
+        label = fa.states[members[0]] if len(members) == 1 else '%d states' % len(members)
+        final = any(fa.final[q] for q in members)
+        out.write('%d [label=%s, shape=%s];\n' % (c, quote(label), 'doublecircle' if final else 'circle'))
+    for c in sorted(set(comp[q] for q in fa.start)):
+        out.write('start -> %d [color=blue];\n' % c)
+    for c, members in enumerate(comps):
+        edges = {}
+        for q in members:
+            for p, letters in targets(fa, q).items():
+                if comp[p] != c:
+                    edges.setdefault(comp[p], set()).update(letters)
+        for d, letters in edges.items():
+            out.write('%d -> %d [label=%s];\n' % (c, d, quote(class_label(sorted(letters)))))
+    out.write('}\n')
+
+
+def render(fa, path, view=None, max_states=100):
+    # view: None (everything), 'bfs' or 'scc'; a .dot path is written as is,
+    # any other extension (png, svg, pdf, ...) is rendered by dot
+    fa = faio.FA.of(fa)
+    fmt = os.path.splitext(path)[1][1:] or 'dot'
+    if fmt == 'dot':
+        out = open(path, 'w', encoding='utf-8')
+        proc = None
+    else:
+        proc = subprocess.Popen(['dot', '-T' + fmt, '-o', path], stdin=subprocess.PIPE, encoding='utf-8')
+        out = proc.stdin
+    try:
+        if view == 'scc':
+            write_condensed(fa, out)
+        elif view == 'bfs':
+            write_dot(fa, out, bfs_view(fa, max_states))
+        else:
+            write_dot(fa, out)
+    finally:
+        out.close()
+    if proc is not None and proc.wait() != 0:
+        raise RuntimeError("dot failed with exit code %d" % proc.returncode)
+
+
+if __name__ == "__main__":
+    # usage: fadot.py <in.json|in.fab> <out.dot|out.png|out.svg> [bfs [N]|scc]
+    if len(sys.argv) <= 2:
+        print("Input is incorrect")
+        sys.exit(1)
+    view = sys.argv[3] if len(sys.argv) > 3 else None
+    if view not in (None, 'bfs', 'scc'):
+        print("Unknown view:", view)
+        sys.exit(1)
+    max_states = int(sys.argv[4]) if len(sys.argv) > 4 else 100
+    render(faio.load_fa(sys.argv[1]), sys.argv[2], view, max_states)
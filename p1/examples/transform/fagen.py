@@ -0,0 +1,65 @@
+import random
+import sys
+
+import faio
+
+
+def letters_of(k):
+    return [str(i) for i in range(k)] if k > 2 else ['a', 'b'][:k]
+
+
+def random_nfa(n, k, density=0.5, nondet=2, seed=0, eps=0.0):
+    # n states, k letters; every (state, letter) has a transition with
+    # probability density, and then 1..nondet targets; every state gets an
+    # epsilon-transition with probability eps. State 0 is the start state,
+    # about a quarter of the states are final.
+    rnd = random.Random(seed)
+    fa = faio.FA(['q%d' % i for i in range(n)], letters_of(k))
+    fa.start = [0] if n else []
+    for q in range(n):
+        fa.final[q] = rnd.random() < 0.25
+        for a in range(k):
+            if rnd.random() < density:
+                for _ in range(rnd.randint(1, nondet)):
+                    fa.add_transition(q, a, rnd.randrange(n))
+        if rnd.random() < eps:
+            fa.add_eps(q, rnd.randrange(n))
+    return fa
+
+
+def random_dfa(n, k, density=1.0, seed=0):
+    fa = random_nfa(n, k, density, 1, seed)
+    fa.compile_table()
+    return fa
+
+
+def nth_from_end(n, k=2):
+    # (a|b)* a (a|b)^(n-1): the NFA has n+1 states, the minimal DFA 2^n
+    fa = faio.FA(['q%d' % i for i in range(n + 1)], letters_of(k))
+    fa.start = [0]
+    fa.final[n] = 1
+    for a in range(k):
+        fa.add_transition(0, a, 0)
+    fa.add_transition(0, 0, 1)
+    for q in range(1, n):
+        for a in range(k):
+            fa.add_transition(q, a, q + 1)
+    return fa
+
+
+if __name__ == "__main__":
+    # usage: fagen.py nfa|dfa|nth <out.json|out.fab> <n> [k] [seed]
+    if len(sys.argv) <= 3:
+        print("Input is incorrect")
+        sys.exit(1)
+    kind = sys.argv[1]
+    n = int(sys.argv[3])
+    k = int(sys.argv[4]) if len(sys.argv) > 4 else 2
+    seed = int(sys.argv[5]) if len(sys.argv) > 5 else 0
+    if kind == 'nfa':
+        fa = random_nfa(n, k, seed=seed)
+    elif kind == 'dfa':
+        fa = random_dfa(n, k, seed=seed)
+    else:
+        fa = nth_from_end(n, k)
+    faio.out_fa(fa)
@@ -1,6 +1,14 @@
 import json
 import sys
 import os
+import mmap
+import struct
+from array import array
+
+try:
+    import numpy as np
+except ImportError: # numpy is optional, FA.numpy_table() needs it
+    np = None
 
 dfa = {}
 nfa = {}
@@ -14,26 +22,41 @@ def check_input_correctness():
     else:
         return
 
-def load_dfa():
-    return load_fa()
+def load_dfa(path=None):
+    return load_fa(path)
 
-def load_nfa():
-    return load_fa()
+def load_nfa(path=None):
+    return load_fa(path)
 
-def load_fa():
-    check_input_correctness()
+def load_fa(path=None):
+    # path defaults to the first command line argument
+    if path is None:
+        check_input_correctness()
+        path = sys.argv[1]
     global nfa
-    with open(sys.argv[1], 'r') as inpjson:
+    if is_binary(path):
+        nfa = load_binary(path)
+        return nfa
+    with open(path, 'r') as inpjson:
         nfa = json.loads(inpjson.read())
         return nfa
 
         
-def out_dfa(fa):
-    out_fa(fa)
+def out_dfa(fa, path=None):
+    out_fa(fa, path=path)
 
-def out_fa(fa, need_finalize_for_plot=True):
-    check_input_correctness()
-    with open(sys.argv[2], 'w') as outjson:
+def out_fa(fa, need_finalize_for_plot=True, path=None):
+    # path defaults to the second command line argument
+    if path is None:
+        check_input_correctness()
+        path = sys.argv[2]
+    if path.endswith(BINARY_SUFFIX):
+        save_binary(fa, path)
+        return
+    if isinstance(fa, FA):
+        fa = fa.to_json()
+        need_finalize_for_plot = False # FA names are strings already
+    with open(path, 'w') as outjson:
         if need_finalize_for_plot:
         # finalize labels as strings:
             for i, item in enumerate(fa['states']):
@@ -51,6 +74,281 @@ def out_fa(fa, need_finalize_for_plot=True):
         
         outjson.write(json.dumps(fa, indent = 4))
 
+# labels read as epsilon-transitions; they are not letters of the alphabet
+EPSILON = 'eps'
+EPSILON_LETTERS = (EPSILON, 'ε', '')
+
+
+def state_name(item):
+    # subset states (lists of names) are flattened the same way out_fa does
+    return "_".join(item) if isinstance(item, (list, tuple)) else item
+
+
+class FA(object):
+    """
+    Automaton with state and letter names interned to ints 0..n-1 / 0..k-1.
+    succ[q] maps a letter id to the list of successor ids (NFA view); when the
+    automaton is deterministic, table is a dense array('i') of n*k entries,
+    table[q*k + a] is the successor or -1 if there is no transition (DFA view).
+    A DFA loaded with load_binary() has only the table, as a zero-copy view of
+    the mapped file; succ is then built from it on first access.
+    eps[q] lists the epsilon-successors of q.
+    """
+    def __init__(self, states, letters):
+        self.states = [state_name(s) for s in states]
+        self.state_id = {name: i for i, name in enumerate(self.states)}
+        self.letters = [a for a in letters if a not in EPSILON_LETTERS]
+        self.letter_id = {letter: i for i, letter in enumerate(self.letters)}
+        self.start = []
+        self.final = bytearray(len(self.states))
+        self._succ = [{} for _ in self.states]
+        self.eps = [[] for _ in self.states]
+        self.table = None
+
+    @classmethod
+    def from_json(cls, fa):
+        res = cls(fa['states'], fa['letters'])
+        res.start = [res.add_state(s) for s in fa['start_states']]
+        for s in fa['final_states']:
+            res.final[res.add_state(s)] = 1
+        for src, letter, dst in fa['transition_function']:
+            if letter in EPSILON_LETTERS:
+                res.add_eps(res.add_state(src), res.add_state(dst))
+            else:
+                res.add_transition(res.add_state(src), res.letter_id[letter], res.add_state(dst))
+        if res.is_deterministic():
+            res.compile_table()
+        return res
+
+    @classmethod
+    def of(cls, fa):
+        return fa if isinstance(fa, cls) else cls.from_json(fa)
+
+    def to_json(self):
+        fa = {}
+        fa['states'] = list(self.states)
+        fa['letters'] = list(self.letters)
+        fa['transition_function'] = [[self.states[q], self.letters[a], self.states[p]]
+                                     for q, a, p in self.transitions()]
+        fa['transition_function'] += [[self.states[q], EPSILON, self.states[p]]
+                                      for q, p in self.eps_transitions()]
+        fa['start_states'] = [self.states[q] for q in self.start]
+        fa['final_states'] = [self.states[q] for q in range(len(self.states)) if self.final[q]]
+        return fa
+
+    @property
+    def succ(self):
+        if self._succ is None:
+            succ = [{} for _ in self.states]
+            for q, a, p in self.transitions(): # still reads the table
+                succ[q][a] = [p]
+            self._succ = succ
+        return self._succ
+
+    def add_state(self, name):
+        name = state_name(name)
+        q = self.state_id.get(name)
+        if q is None: # tolerate states used in transitions but not listed
+            q = self.state_id[name] = len(self.states)
+            self.states.append(name)
+            self.final.append(0)
+            self.succ.append({})
+            self.eps.append([])
+            self.table = None
+        return q
+
+    def add_transition(self, q, a, p):
+        dsts = self.succ[q].setdefault(a, [])
+        if p not in dsts:
+            dsts.append(p)
+            self.table = None
+
+    def add_eps(self, q, p):
+        if p not in self.eps[q]:
+            self.eps[q].append(p)
+            self.table = None
+
+    def eps_transitions(self):
+        for q, dsts in enumerate(self.eps):
+            for p in dsts:
+                yield q, p
+
+    def transitions(self):
+        if self._succ is None:
+            k = len(self.letters)
+            for i, p in enumerate(self.table):
+                if p >= 0:
+                    yield i // k, i % k, p
+            return
+        for q, row in enumerate(self.succ):
+            for a, dsts in row.items():
+                for p in dsts:
+                    yield q, a, p
+
+    def is_deterministic(self):
+        if self._succ is None:
+            return len(self.start) <= 1
+        if any(self.eps):
+            return False
+        return len(self.start) <= 1 and all(len(dsts) <= 1 for row in self.succ for dsts in row.values())
+
+    def compile_table(self):
+        if self._succ is None:
+            return self.table
+        if any(self.eps):
+            raise ValueError("automaton has epsilon-transitions")
+        k = len(self.letters)
+        table = array('i', [-1]) * (len(self.states) * k)
+        for q, row in enumerate(self.succ):
+            for a, dsts in row.items():
+                if len(dsts) > 1:
+                    raise ValueError("state %s is nondeterministic on %s" % (self.states[q], self.letters[a]))
+                table[q * k + a] = dsts[0]
+        self.table = table
+        return table
+
+    def delta(self, q, a):
+        return self.table[q * len(self.letters) + a]
+
+    def successors(self, q, a):
+        return self.succ[q].get(a, ())
+
+    def restrict(self, keep):
+        # new FA on the states q with keep[q] set, in the same order
+        ids = [q for q in range(len(self.states)) if keep[q]]
+        new_id = {q: i for i, q in enumerate(ids)}
+        res = FA([self.states[q] for q in ids], self.letters)
+        res.start = [new_id[q] for q in self.start if q in new_id]
+        for i, q in enumerate(ids):
+            res.final[i] = self.final[q]
+        for q, a, p in self.transitions():
+            if q in new_id and p in new_id:
+                res.add_transition(new_id[q], a, new_id[p])
+        for q, p in self.eps_transitions():
+            if q in new_id and p in new_id:
+                res.add_eps(new_id[q], new_id[p])
+        if res.is_deterministic():
+            res.compile_table()
+        return res
+
+    def numpy_table(self):
+        # zero-copy (n, k) int32 view of the DFA table
+        if np is None:
+            raise ImportError("numpy is required for FA.numpy_table()")
+        if self.table is None:
+            self.compile_table()
+        return np.frombuffer(self.table, dtype=np.int32).reshape(len(self.states), len(self.letters))
+
+
+# Binary container (.fab), all integers little-endian int32/uint32:
+#   header   magic, version, flags, n states, k letters, n start, m transitions, names size
+#   start    int32[n start]
+#   final    uint8[n], zero-padded to a multiple of 4
+#   body     flags & FAB_DFA: int32[n*k] table (-1 = no transition)
+#            otherwise:       int32[3*m] flat (src, letter, dst) triples,
+#                             letter -1 marks an epsilon-transition
+#   names    int32[n+k+1] offsets into the blob, then the utf-8 blob of
+#            the state names followed by the letter names
+BINARY_MAGIC = b'FAB1'
+BINARY_SUFFIX = '.fab'
+FAB_VERSION = 1
+FAB_DFA = 1
+_fab_header = struct.Struct('<4sIIIIIII')
+
+
+def is_binary(path):
+    with open(path, 'rb') as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def _int32_array(items):
+    res = array('i', items)
+    if sys.byteorder == 'big':
+        res.byteswap()
+    return res
+
+
+def save_binary(fa, path):
+    fa = FA.of(fa)
+    n = len(fa.states)
+    k = len(fa.letters)
+    is_dfa = fa.is_deterministic()
+    if is_dfa:
+        body = _int32_array(fa.compile_table())
+        m = sum(1 for p in body if p >= 0)
+    else:
+        body = _int32_array(x for t in fa.transitions() for x in t)
+        body += _int32_array(x for q, p in fa.eps_transitions() for x in (q, -1, p))
+        m = len(body) // 3
+
+    encoded = [name.encode('utf-8') for name in fa.states + fa.letters]
+    offsets = [0]
+    for name in encoded:
+        offsets.append(offsets[-1] + len(name))
+
+    with open(path, 'wb') as f:
+        f.write(_fab_header.pack(BINARY_MAGIC, FAB_VERSION, FAB_DFA if is_dfa else 0,
+                                 n, k, len(fa.start), m, offsets[-1]))
+        f.write(_int32_array(fa.start).tobytes())
+        f.write(bytes(fa.final) + bytes(-n % 4))
+        f.write(body.tobytes())
+        f.write(_int32_array(offsets).tobytes())
+        f.write(b''.join(encoded))
+
+
+def load_binary(path):
+    # The file is mapped read-only: a DFA table is a memoryview straight into
+    # the mapping (no copy, no parse), NFA triples are read from one as well.
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, flags, n, k, n_start, m, names_size = _fab_header.unpack_from(mm, 0)
+    if magic != BINARY_MAGIC or version != FAB_VERSION:
+        raise ValueError("%s is not a version %d .fab file" % (path, FAB_VERSION))
+    view = memoryview(mm)
+
+    def int32_view(offset, count):
+        ints = view[offset:offset + 4 * count].cast('i')
+        if sys.byteorder == 'big':
+            ints = array('i', ints)
+            ints.byteswap()
+        return ints
+
+    pos = _fab_header.size
+    start = int32_view(pos, n_start)
+    pos += 4 * n_start
+    final = bytearray(view[pos:pos + n])
+    pos += n + (-n % 4)
+    body_size = n * k if flags & FAB_DFA else 3 * m
+    body = int32_view(pos, body_size)
+    pos += 4 * body_size
+    offsets = int32_view(pos, n + k + 1)
+    pos += 4 * (n + k + 1)
+    names = [str(mm[pos + offsets[i]:pos + offsets[i + 1]], 'utf-8') for i in range(n + k)]
+
+    fa = FA(names[:n], names[n:])
+    fa.start = list(start)
+    fa.final = final
+    if flags & FAB_DFA:
+        fa._succ = None
+        fa.table = body
+    else:
+        for i in range(0, len(body), 3):
+            if body[i + 1] < 0:
+                fa.add_eps(body[i], body[i + 2])
+            else:
+                fa.add_transition(body[i], body[i + 1], body[i + 2])
+    fa._mmap = mm # keep the mapping alive as long as the views are
+    return fa
+
+
 if __name__ == '__main__':
+    # faio.py <fa.json|fa.fab>: print the automaton
+    # faio.py <in> <out>: convert, the .fab suffix selects the binary format
+    if len(sys.argv) > 2:
+        out_fa(FA.of(load_fa()))
+        sys.exit(0)
+    if is_binary(sys.argv[1]):
+        print(load_binary(sys.argv[1]).to_json())
+        sys.exit(0)
     raw=open(os.getcwd() + os.sep + sys.argv[1]).read()
     print(json.loads(raw))
@@ -0,0 +1,140 @@
+import sys
+from array import array
+from collections import deque
+
+import faio
+import recognize
+
+# Aho-Corasick keyword matching. The keyword trie is completed with failure
+# links and then flattened: every (state, letter) gets its final target, so
+# scanning is one table lookup per input character, with no failure-link
+# chasing at run time. The flattened automaton is a DFA over the keyword
+# letters recognizing "text ending with some keyword"; as a faio.FA it can be
+# minimized and saved like any other DFA (minimization keeps the language but
+# merges states with different keyword sets, so scan with the unminimized one).
+
+
+class KeywordAutomaton(object):
+    """
+    States are trie nodes (keyword prefixes), 0 is the root. out[q] lists the
+    keyword ids ending exactly at q, dict_link[q] is the longest proper suffix
+    state with a non-empty out (-1 if none), so all keywords ending at q are
+    found by following dict_link. Characters outside the keyword alphabet
+    send every state back to the root.
+    """
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        if any(not w for w in self.keywords):
+            raise ValueError("keywords must not be empty")
+        self.letters = sorted({c for w in self.keywords for c in w})
+        self.letter_id = {c: a for a, c in enumerate(self.letters)}
+        k = len(self.letters)
+
+        # trie
+        children = [{}]
+        prefixes = ['']
+        self.out = [[]]
+        for i, w in enumerate(self.keywords):
+            q = 0
+            for c in w:
+                a = self.letter_id[c]
+                p = children[q].get(a)
+                if p is None:
+                    p = children[q][a] = len(children)
+                    children.append({})
+                    prefixes.append(prefixes[q] + c)
+                    self.out.append([])
+                q = p
+            self.out[q].append(i)
+        n = len(children)
+        self.prefixes = prefixes
+
+        # BFS order: failure targets are shallower, so their rows are done
+        table = array('i', [0]) * (n * k)
+        fail = [0] * n
+        self.dict_link = [-1] * n
+        worklist = deque()
+        for a, p in children[0].items():
+            table[a] = p
+            worklist.append(p)
+        while worklist:
+            q = worklist.popleft()
+            f = fail[q]
+            self.dict_link[q] = f if self.out[f] else self.dict_link[f]
+            table[q * k:(q + 1) * k] = table[f * k:(f + 1) * k]
+            for a, p in children[q].items():
+                fail[p] = table[f * k + a]
+                table[q * k + a] = p
+                worklist.append(p)
+        self.table = table
+        self.reports = bytearray(bool(self.out[q]) or self.dict_link[q] >= 0 for q in range(n))
+
+    def matches_at(self, q):
+        # keyword ids ending in state q, longest first
+        res = []
+        while q >= 0:
+            res += self.out[q]
+            q = self.dict_link[q]
+        return res
+
+    def scan(self, text, state=0, offset=0):
+        # (keyword, start offset) for every occurrence, in order of end offset;
+        # bytes are read as latin-1. Returns (matches, state) so that
+        # scanning can go on with the next chunk from state at offset + len(text)
+        if not isinstance(text, str):
+            text = bytes(text).decode('latin-1')
+        table = self.table
+        k = len(self.letters)
+        letter_id = self.letter_id
+        reports = self.reports
+        res = []
+        q = state
+        for i, c in enumerate(text):
+            a = letter_id.get(c)
+            q = 0 if a is None else table[q * k + a]
+            if reports[q]:
+                end = offset + i + 1
+                res += [(self.keywords[w], end - len(self.keywords[w])) for w in self.matches_at(q)]
+        return res, q
+
+    def finditer(self, chunks):
+        # all matches over an iterable of chunks (see recognize.iter_chunks);
+        # keywords spanning chunk borders are found
+        q = 0
+        offset = 0
+        for chunk in chunks:
+            res, q = self.scan(chunk, q, offset)
+            offset += len(chunk)
+            for m in res:
+                yield m
+
+    def findall(self, text):
+        return self.scan(text)[0]
+
+    def to_fa(self):
+        # the flattened DFA as a faio.FA, states named by their prefix
+        fa = faio.FA([repr(p) for p in self.prefixes], self.letters)
+        fa.start = [0]
+        fa.final = bytearray(self.reports)
+        fa._succ = None
+        fa.table = array('i', self.table)
+        return fa
+
+
+def read_keywords(path):
+    with open(path) as f:
+        return [line.rstrip('\n') for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    # usage: keywords.py <keywords.txt> <out.json|out.fab>: write the DFA
+    #        keywords.py <keywords.txt> scan <file>: print "offset keyword" per match
+    if len(sys.argv) <= 2 or (sys.argv[2] == 'scan' and len(sys.argv) <= 3):
+        print("Input is incorrect")
+        sys.exit(1)
+    ac = KeywordAutomaton(read_keywords(sys.argv[1]))
+    if sys.argv[2] == 'scan':
+        for keyword, offset in ac.finditer(recognize.iter_chunks(sys.argv[3])):
+            print(offset, keyword)
+    else:
+        faio.out_fa(ac.to_fa(), path=sys.argv[2])
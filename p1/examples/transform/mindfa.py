@@ -1,68 +1,71 @@
 import json 
 import sys
+import alphabet
+import faanalysis
 import faio
 
-dfa = {}
-reachable_states = []
-split_needed = None
-dis_set = None
 
 class DisjointSet(object):
+	# union-find with path compression and union by rank;
+	# the members of every class are kept at its root
 	def __init__(self,items):
-		self._disjoint_set = list()
+		self._parent = dict()
+		self._rank = dict()
+		self._members = dict()
 
 		if items:
-			for item in set(items):
-				self._disjoint_set.append([item])
-
-	def _get_index(self,item):
-		for s in self._disjoint_set:
-			for _item in s:
-				if _item == item:
-					return self._disjoint_set.index(s)
-		return None
+			for item in items:
+				self.add(item)
+
+	def add(self,item):
+		if item not in self._parent:
+			self._parent[item] = item
+			self._rank[item] = 0
+			self._members[item] = [item]
+
+	def _root(self,item):
+		root = item
+		while self._parent[root] != root:
+			root = self._parent[root]
+		while self._parent[item] != root:
+			self._parent[item], item = root, self._parent[item]
+		return root
 
 	def find(self,item):
-		for s in self._disjoint_set:
-			if item in s:
-				return s
-		return None
+		if item not in self._parent:
+			return None
+		return self._members[self._root(item)]
 
 	def find_set(self, item):
-		s = self._get_index(item)
-		return s+1 if s is not None else None 
+		if item not in self._parent:
+			return None
+		return list(self._members).index(self._root(item)) + 1
+
+	def connected(self,item1,item2):
+		return self._root(item1) == self._root(item2)
 
 	def union(self,item1,item2):
-		i = self._get_index(item1)
-		j = self._get_index(item2)
+		i = self._root(item1)
+		j = self._root(item2)
 
 		if i != j:
-			self._disjoint_set[i] += self._disjoint_set[j]
-			del self._disjoint_set[j]
+			if self._rank[i] < self._rank[j]:
+				i, j = j, i
+			self._parent[j] = i
+			if self._rank[i] == self._rank[j]:
+				self._rank[i] += 1
+			self._members[i] += self._members.pop(j)
 	
 	def get(self):
-		return self._disjoint_set
+		return list(self._members.values())
 
 
-def reachable_dfs(node):
-    global dfa, reachable_states
-    for val in dfa['transition_function']:
-        src = val[0]
-        inp = val[1]
-        dst = val[2]
-        
-        if src == node:
-            if dst not in reachable_states:
-                reachable_states.append(dst)
-                reachable_dfs(dst)
-
-
-def remove_unreachable_states():
-    global dfa, reachable_states
-
-    for st in dfa['start_states']:
-        reachable_states.append(st)
-        reachable_dfs(st)
+def remove_unreachable_states(dfa, index=None):
+    # dfa is a JSON dict, changed in place; index is faio.FA over it
+    if index is None:
+        index = faio.FA.from_json(dfa)
+    reachable = faanalysis.forward_reachable(index)
+    reachable_states = {index.states[q] for q in range(len(index.states)) if reachable[q]}
 
     dfa['states'] = [state for state in dfa['states'] if state in reachable_states]
     dfa['final_states'] = [state for state in dfa['final_states'] if state in reachable_states]
@@ -73,15 +76,16 @@ def remove_unreachable_states():
             temp.append(val)
 
     dfa['transition_function'] = temp
+    return dfa
 
-def get_to_state(start, inp):
-    global dfa
-    for val in dfa['transition_function']:
-        if start == val[0] and inp == val[1]:
-            return val[2]
+def get_to_state(index, start, inp):
+    p = index.delta(index.state_id[start], index.letter_id[inp])
+    return index.states[p] if p >= 0 else None
 
-def minimiseDFA():
-    global dfa, split_needed, dis_set
+def minimiseDFA(dfa, index=None):
+    # pairwise distinguishability fixpoint over a JSON dict, changed in place
+    if index is None:
+        index = faio.FA.from_json(dfa)
     split_needed = 1
     prev_states = []
     new_states = []
@@ -118,16 +122,22 @@ def minimiseDFA():
                     continue
 
                 for letter in dfa['letters']:
-                    to1 = get_to_state(st1, letter)
-                    to2 = get_to_state(st2, letter)
-
-                    if to1 != None and to2 != None and to1 != to2:
+                    to1 = get_to_state(index, st1, letter)
+                    to2 = get_to_state(index, st2, letter)
+
+                    if to1 == to2:
+                        continue
+                    # a missing transition goes to the dead state; on a
+                    # trimmed DFA every state is distinguished from it
+                    if to1 == None or to2 == None:
+                        is_same_grp = False
+                    else:
                         is_same_grp = group[(to1, to2) if to1 < to2 else (to2, to1)]
-                        split_needed = split_needed or not is_same_grp
-                        group[(st1, st2)] = is_same_grp
-                        
-                        if not is_same_grp:
-                            break
+                    split_needed = split_needed or not is_same_grp
+                    group[(st1, st2)] = is_same_grp
+
+                    if not is_same_grp:
+                        break
 
     dis_set = DisjointSet(dfa['states'])
 
@@ -173,10 +183,172 @@ def minimiseDFA():
             start_states.append(st_set)
     
     dfa['start_states'] = start_states
+    return dfa
+
+
+def hopcroft_minimise(fa):
+    # Hopcroft partition refinement, O(k n log n). fa is a (possibly partial)
+    # faio.FA DFA; missing transitions go to an implicit sink state.
+    # Works on the table only, so a DFA mapped by faio.load_binary() is
+    # minimised without building its successor lists.
+    # Returns a new faio.FA whose states are "_"-joined classes of fa states.
+    n = len(fa.states)
+    k = len(fa.letters)
+    if n == 0:
+        return faio.FA([], fa.letters)
+    if fa.table is None:
+        fa.compile_table()
+    table = fa.table
+    sink = n
+    if -1 in table:
+        n += 1
+    else:
+        sink = None
+
+    def target(q, a):
+        if q == sink:
+            return sink
+        p = table[q * k + a]
+        return sink if p < 0 else p
+
+    # inverse transitions per letter in CSR form: inv_src[a][inv_first[a][p]:inv_first[a][p+1]]
+    # are the states q with target(q, a) == p
+    inv_first = []
+    inv_src = []
+    for a in range(k):
+        first = [0] * (n + 1)
+        for q in range(n):
+            first[target(q, a) + 1] += 1
+        for p in range(n):
+            first[p + 1] += first[p]
+        pos = first[:]
+        src = [0] * n
+        for q in range(n):
+            p = target(q, a)
+            src[pos[p]] = q
+            pos[p] += 1
+        inv_first.append(first)
+        inv_src.append(src)
+
+    # blocks are ranges [b_first[b], b_end[b]) of elems; loc[q] is q's position
+    finals = [q for q in range(len(fa.states)) if fa.final[q]]
+    others = [q for q in range(n) if q == sink or not fa.final[q]]
+    elems = []
+    b_first = []
+    b_end = []
+    block = [0] * n
+    for part in (others, finals):
+        if part:
+            for q in part:
+                block[q] = len(b_first)
+            b_first.append(len(elems))
+            elems += part
+            b_end.append(len(elems))
+    loc = [0] * n
+    for i, q in enumerate(elems):
+        loc[q] = i
+    b_marked = b_first[:]
+
+    # splitter worklist of blocks, each used with every letter
+    in_work = [False] * len(b_first)
+    smallest = min(range(len(b_first)), key=lambda b: b_end[b] - b_first[b])
+    work = [smallest]
+    in_work[smallest] = True
+
+    while work:
+        splitter = work.pop()
+        in_work[splitter] = False
+        splitter_states = elems[b_first[splitter]:b_end[splitter]]
+        for a in range(k):
+            first = inv_first[a]
+            src = inv_src[a]
+            touched = []
+            for p in splitter_states:
+                for i in range(first[p], first[p + 1]):
+                    q = src[i]
+                    b = block[q]
+                    m = b_marked[b]
+                    if loc[q] < m:
+                        continue # already marked
+                    if m == b_first[b]:
+                        touched.append(b)
+                    # swap q into the marked prefix of its block
+                    other = elems[m]
+                    elems[m], elems[loc[q]] = q, other
+                    loc[other], loc[q] = loc[q], m
+                    b_marked[b] = m + 1
+
+            for b in touched:
+                m = b_marked[b]
+                b_marked[b] = b_first[b]
+                if m == b_end[b]:
+                    continue # the whole block is marked, nothing to split
+                # the marked prefix becomes a new block
+                new = len(b_first)
+                b_first.append(b_first[b])
+                b_end.append(m)
+                b_marked.append(b_first[b])
+                b_first[b] = m
+                b_marked[b] = m
+                for i in range(b_first[new], m):
+                    block[elems[i]] = new
+                in_work.append(False)
+                if in_work[b] or b_end[new] - b_first[new] <= b_end[b] - b_first[b]:
+                    add = new
+                else:
+                    add = b
+                in_work[add] = True
+                work.append(add)
+
+    # states unreachable from the start states are left out of the result,
+    # which drops the sink and any block with no reachable member
+    reachable = bytearray(n)
+    stack = list(fa.start)
+    for q in stack:
+        reachable[q] = 1
+    while stack:
+        q = stack.pop()
+        for a in range(k):
+            p = table[q * k + a]
+            if p >= 0 and not reachable[p]:
+                reachable[p] = 1
+                stack.append(p)
+
+    # one state per block
+    members = [sorted(q for q in elems[b_first[b]:b_end[b]] if reachable[q]) for b in range(len(b_first))]
+    blocks = sorted((b for b in range(len(b_first)) if members[b]), key=lambda b: members[b][0])
+    new_id = {b: i for i, b in enumerate(blocks)}
+
+    res = faio.FA([[fa.states[q] for q in members[b]] for b in blocks], fa.letters)
+    res.start = sorted({new_id[block[q]] for q in fa.start})
+    for b in blocks:
+        rep = members[b][0]
+        if fa.final[rep]:
+            res.final[new_id[b]] = 1
+        for a in range(k):
+            p = table[rep * k + a]
+            if p >= 0:
+                res.add_transition(new_id[b], a, new_id[block[p]])
+    res.compile_table()
+    return res
 
 
 if __name__ == "__main__":
-    dfa=faio.load_dfa()
-    remove_unreachable_states()
-    minimiseDFA()
-    faio.out_dfa(dfa)
+    # usage: mindfa.py <in.json> <out.json> [hopcroft|table]
+    mode = sys.argv[3] if len(sys.argv) > 3 else 'hopcroft'
+    loaded = faio.load_dfa() # JSON dict or, for .fab input, faio.FA
+    index = faio.FA.of(loaded)
+    if not index.is_deterministic():
+        raise ValueError("input automaton is not deterministic")
+    index.compile_table()
+    if mode == 'hopcroft':
+        faio.out_dfa(alphabet.over_classes(faanalysis.trim(index), hopcroft_minimise))
+    elif mode == 'table':
+        # trimmed, so a missing transition is the only way to the dead state
+        index = faanalysis.trim(index)
+        dfa = index.to_json()
+        minimiseDFA(dfa, index)
+        faio.out_dfa(dfa)
+    else:
+        print("Unknown minimisation mode:", mode)
+        sys.exit(1)
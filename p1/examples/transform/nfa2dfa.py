@@ -1,51 +1,374 @@
+import multiprocessing
+import os
+import queue
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import alphabet
+import faanalysis
 import faio
 
-def get_power_set(nfa_states):
-    powerset = [[]]
-    for i in nfa_states:
-        for subset in powerset:
-            powerset = powerset + [list(subset) + [i]]
-    return powerset
-  
-  
+
+def epsilon_closures(nfa):
+    # Epsilon-closure of every state as an int bitmask, computed once.
+    # The epsilon-graph is condensed into SCCs: all states of an SCC share one
+    # closure, and since Tarjan numbers SCCs sinks-first, each closure is its
+    # members OR the already known closures of the SCCs it points to.
+    n = len(nfa.states)
+    closure = [1 << q for q in range(n)]
+    if not any(nfa.eps):
+        return closure
+
+    comp, comps = faanalysis.tarjan_scc(nfa.eps)
+    comp_closure = []
+    for c, members in enumerate(comps):
+        mask = 0
+        for q in members:
+            mask |= 1 << q
+            for p in nfa.eps[q]:
+                if comp[p] != c:
+                    mask |= comp_closure[comp[p]]
+        comp_closure.append(mask)
+    for q in range(n):
+        closure[q] = comp_closure[comp[q]]
+    return closure
+
+
+def remove_epsilon(nfa):
+    # Equivalent NFA without epsilon-transitions on the same states: q goes
+    # by a wherever its closure does, and q is final if its closure has a
+    # final state
+    nfa = faio.FA.of(nfa)
+    if not any(nfa.eps):
+        return nfa
+    closure = epsilon_closures(nfa)
+    res = faio.FA(nfa.states, nfa.letters)
+    res.start = list(nfa.start)
+    for q in range(len(nfa.states)):
+        rest = closure[q]
+        while rest:
+            low = rest & -rest
+            p = low.bit_length() - 1
+            if nfa.final[p]:
+                res.final[q] = 1
+            for a, dsts in nfa.succ[p].items():
+                for r in dsts:
+                    res.add_transition(q, a, r)
+            rest ^= low
+    if res.is_deterministic():
+        res.compile_table()
+    return res
+
+
+class StateBudgetExceeded(Exception):
+    pass
+
+
+def subset_steps(nfa):
+    # (step, final_mask, start) for the subset construction: step[q][a] is
+    # the epsilon-closed bitmask of the successors of q by letter a
+    n = len(nfa.states)
+    k = len(nfa.letters)
+    closure = epsilon_closures(nfa)
+
+    step = [[0] * k for _ in range(n)]
+    for q, a, p in nfa.transitions():
+        step[q][a] |= closure[p]
+
+    final_mask = 0
+    for q in range(n):
+        if nfa.final[q]:
+            final_mask |= 1 << q
+
+    start = 0
+    for q in nfa.start:
+        start |= closure[q]
+    return step, final_mask, start
+
+
+def subset_name(nfa, mask):
+    return sorted(nfa.states[q] for q in range(mask.bit_length()) if mask >> q & 1)
+
+
+def post(step, mask, a):
+    q_to = 0
+    while mask:
+        low = mask & -mask
+        q_to |= step[low.bit_length() - 1][a]
+        mask ^= low
+    return q_to
+
+
+def determinize(nfa, max_states=None):
+    # Subset construction driven by a worklist: only subsets reachable from
+    # the start subset are ever discovered. A subset is kept as an int bitmask
+    # over the NFA states (bit i <=> state id i), so it is hashable and union
+    # is a single "|". Subsets are epsilon-closed: the closures are folded
+    # into the per-state steps and the start subset up front.
+    # With max_states set, StateBudgetExceeded is raised as soon as more DFA
+    # states than that are discovered.
+    nfa = faio.FA.of(nfa)
+    k = len(nfa.letters)
+    step, final_mask, start = subset_steps(nfa)
+
+    # DFA state ids are handed out in discovery order, so the worklist holds ids
+    masks = [start]
+    dfa_id = {start: 0}
+    transitions = []
+    worklist = deque([0])
+    while worklist:
+        d = worklist.popleft()
+        mask = masks[d]
+        for a in range(k):
+            q_to = post(step, mask, a)
+            if not q_to:
+                continue # no transition: the empty subset is left out as a dead state
+            if q_to not in dfa_id:
+                if max_states is not None and len(masks) >= max_states:
+                    raise StateBudgetExceeded("more than %d DFA states" % max_states)
+                dfa_id[q_to] = len(masks)
+                masks.append(q_to)
+                worklist.append(dfa_id[q_to])
+            transitions.append((d, a, dfa_id[q_to]))
+
+    return subset_dfa(nfa, masks, transitions, final_mask)
+
+
+def subset_dfa(nfa, masks, transitions, final_mask):
+    dfa = faio.FA([subset_name(nfa, mask) for mask in masks], nfa.letters) # \Sigma are equal
+    dfa.start = [0]
+    for d, mask in enumerate(masks):
+        if mask & final_mask:
+            dfa.final[d] = 1
+    for d, a, p in transitions:
+        dfa.add_transition(d, a, p)
+    dfa.compile_table()
+    return dfa
+
+
+# Parallel subset construction. Shard s owns the subsets with
+# shard_of(mask, shards) == s: only it numbers and expands them. The build
+# runs in BFS rounds: every shard expands the new subsets it received and
+# sends the successor subsets straight to their owners, one batch per owner
+# and round on the queue of that (sender, owner) pair. This process only
+# sees a count per shard and round, to stop the rounds once nothing was
+# sent. Then the shards trade the ids of the subsets their transitions go
+# to, the same way, and return their states and transitions already
+# numbered as (owner, local id).
+
+_shard = {}
+
+_MIX = 0x9E3779B97F4A7C15 # odd, 2^64 / golden ratio
+_WORD = (1 << 64) - 1
+
+
+def shard_of(mask, shards):
+    # hash() of an int is the int itself, so hash(mask) % shards would only
+    # look at the lowest states, and a state in every subset (e.g. a start
+    # state with a self-loop) would leave shards empty. The mask is folded
+    # 64 bits at a time with a multiplicative hash instead.
+    h = 0
+    while True:
+        h = ((h ^ (mask & _WORD)) * _MIX) & _WORD
+        mask >>= 64
+        if not mask:
+            return (h >> 32) % shards
+
+
+def shard_sizes(nfa, shards):
+    # number of subsets each of shards shards would own, to check the spread
+    nfa = faio.FA.of(nfa)
+    step, final_mask, start = subset_steps(nfa)
+    counts = [0] * shards
+    if not start:
+        return counts
+    seen = {start}
+    worklist = [start]
+    while worklist:
+        mask = worklist.pop()
+        counts[shard_of(mask, shards)] += 1
+        for a in range(len(nfa.letters)):
+            q_to = post(step, mask, a)
+            if q_to and q_to not in seen:
+                seen.add(q_to)
+                worklist.append(q_to)
+    return counts
+
+
+class _Stopped(Exception):
+    pass
+
+
+def _receive(link):
+    # None is sent on every queue when the build is given up
+    batch = link.get()
+    if batch is None:
+        raise _Stopped()
+    return batch
+
+
+def _init_shard(step, states, final_mask, start, links, control, results):
+    _shard.update(step=step, states=states, final_mask=final_mask, start=start,
+                  links=links, control=control, results=results)
+
+
+def _run_shard(s):
+    try:
+        return _shard_build(s)
+    except _Stopped:
+        for link in _shard['links'][s]:
+            if link is not None:
+                link.cancel_join_thread() # its batches will not be read
+        return None
+
+
+def _shard_build(s):
+    step = _shard['step']
+    links = _shard['links'] # links[s][t]: batches from shard s to shard t
+    control = _shard['control'][s]
+    results = _shard['results']
+    shards = len(links)
+    others = [t for t in range(shards) if t != s]
+    k = len(step[0]) if step else 0
+    start = _shard['start']
+    ids = {}
+    masks = []
+    transitions = [] # (local id, letter, successor mask)
+    # the start subset, and an empty batch from everyone so every round
+    # starts by reading one batch from each other shard
+    local = [start] if shard_of(start, shards) == s else []
+    for t in others:
+        links[s][t].put([])
+    while True:
+        batch = local
+        for t in others:
+            batch += _receive(links[t][s])
+        out = [set() for _ in range(shards)]
+        new = 0
+        for mask in batch:
+            if mask in ids:
+                continue
+            d = ids[mask] = len(masks)
+            masks.append(mask)
+            new += 1
+            for a in range(k):
+                q_to = post(step, mask, a)
+                if not q_to:
+                    continue
+                transitions.append((d, a, q_to))
+                owner = shard_of(q_to, shards)
+                if owner != s or q_to not in ids:
+                    out[owner].add(q_to)
+        local = list(out[s])
+        for t in others:
+            links[s][t].put(list(out[t]))
+        results.put((s, new, sum(len(x) for x in out)))
+        if _receive(control) == 'done':
+            break
+    for t in others:
+        _receive(links[t][s]) # the empty batches of the last round
+
+    # ids of the subsets owned by others: send each owner the masks, answer
+    # their requests, then read the answers (every link is FIFO)
+    need = [sorted({q_to for _, _, q_to in transitions if shard_of(q_to, shards) == t}) for t in range(shards)]
+    for t in others:
+        links[s][t].put(need[t])
+    for t in others:
+        links[s][t].put([ids[mask] for mask in _receive(links[t][s])])
+    remote = [None] * shards
+    for t in others:
+        remote[t] = dict(zip(need[t], _receive(links[t][s])))
+    remote[s] = ids
+    res = []
+    for d, a, q_to in transitions:
+        t = shard_of(q_to, shards)
+        res.append((d, a, t, remote[t][q_to]))
+    states = _shard['states']
+    final_mask = _shard['final_mask']
+    names = [sorted(states[q] for q in range(mask.bit_length()) if mask >> q & 1) for mask in masks]
+    final = [1 if mask & final_mask else 0 for mask in masks]
+    return names, final, res
+
+
+def _gather(results, futures):
+    # next shard report; fails instead of hanging if a shard died
+    while True:
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            for f in futures:
+                if f.done():
+                    f.result() # raises the shard's exception
+                    raise RuntimeError("shard stopped early")
+
+
+def determinize_parallel(nfa, workers=None, max_states=None):
+    # Same DFA as determinize() up to state numbering, built by workers
+    # shards in as many processes
+    nfa = faio.FA.of(nfa)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return determinize(nfa, max_states)
+    step, final_mask, start = subset_steps(nfa)
+    if not start:
+        return determinize(nfa, max_states)
+
+    ctx = multiprocessing.get_context()
+    links = [[ctx.Queue() if s != t else None for t in range(workers)] for s in range(workers)]
+    control = [ctx.Queue() for _ in range(workers)]
+    results = ctx.Queue()
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_shard,
+                             initargs=(step, nfa.states, final_mask, start, links, control, results)) as pool:
+        futures = [pool.submit(_run_shard, s) for s in range(workers)]
+        try:
+            total = 0
+            cmd = 'go'
+            while cmd != 'done':
+                sent = 0
+                for _ in range(workers):
+                    s, new, out = _gather(results, futures)
+                    total += new
+                    sent += out
+                if max_states is not None and total > max_states:
+                    raise StateBudgetExceeded("more than %d DFA states" % max_states)
+                cmd = 'done' if not sent else 'go'
+                for c in control:
+                    c.put(cmd)
+            parts = [f.result() for f in futures]
+        except BaseException:
+            # wake up every shard, wherever it waits
+            for c in control:
+                c.put(None)
+            for row in links:
+                for link in row:
+                    if link is not None:
+                        link.put(None)
+            raise
+
+    # numbered shard by shard from the owner of the start subset, whose
+    # local id 0 it is
+    first = shard_of(start, workers)
+    order = [(first + i) % workers for i in range(workers)]
+    offset = [0] * workers
+    names = []
+    for s in order:
+        offset[s] = len(names)
+        names += parts[s][0]
+    dfa = faio.FA(names, nfa.letters)
+    dfa.start = [0]
+    for s in order:
+        for d, final in enumerate(parts[s][1]):
+            dfa.final[offset[s] + d] = final
+        for d, a, t, p in parts[s][2]:
+            dfa.add_transition(offset[s] + d, a, offset[t] + p)
+    dfa.compile_table()
+    return dfa
+
+
 if __name__ == "__main__":
+    # usage: nfa2dfa.py <nfa> <out> [workers]
     nfa = faio.load_nfa()
-    dfa = {}
-    dfa['states'] = []
-    dfa['letters'] = nfa['letters'] # \Sigma are equal
-    dfa['transition_function'] = []
-    
-    nfa_states = []
-    for state in nfa['states']:
-        nfa_states.append(state) # Q_0 DFA == Q NFA
-
-    dfa_states = get_power_set(nfa_states)[1:] # set of sets of the states
-
-    dfa['states'] = []
-    for states in dfa_states:
-        dfa['states'].append(states[:])
-        for letter in nfa['letters']:
-            q_to = []
-            for state in states:
-                for val in nfa['transition_function']:
-                    src = val[0]
-                    inp = val[1]
-                    dst = val[2]
-                    if state == src and letter == inp:
-                        if dst not in q_to:
-                            q_to.append(dst)
-            q_states = []
-            for i in states:
-                q_states.append(i)
-            dfa['transition_function'].append([sorted(q_states), letter, sorted(q_to)])
-    dfa['start_states'] = []
-    for state in nfa['start_states']:
-        dfa['start_states'].append([state])
-    dfa['final_states'] = []
-    for states in dfa['states']:
-        for state in states:
-            if state in nfa['final_states'] and states not in dfa['final_states']:
-                dfa['final_states'].append(states)
-    
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    dfa = alphabet.over_classes(faanalysis.trim(nfa), lambda fa: determinize_parallel(fa, workers))
     faio.out_dfa(dfa)
-    
@@ -0,0 +1,156 @@
+import sys
+
+import faio
+import nfa2dfa
+
+
+class BitNFA(object):
+    """
+    Direct NFA simulation without determinization. The current state set is
+    an int bitmask; steps[a][q] is the epsilon-closed successor mask of state
+    q by letter a, and a step ORs the masks of the active states. These are
+    k * n masks of n bits, i.e. k * n^2 bits: quadratic in the number of
+    states, but no DFA states at all.
+    With chunk > 1 the states are also split into chunks of `chunk` bits with
+    a precomputed table per chunk value, so one step costs n/chunk lookups
+    and ORs instead of one per active state. That is k * n * 2^chunk / chunk
+    masks of n bits, e.g. about 4x the per-state masks for chunk=4 and 30x
+    for chunk=8, so it is opt-in.
+    """
+    def __init__(self, nfa, chunk=1):
+        nfa = faio.FA.of(nfa)
+        self.chunk = chunk
+        self.fa = nfa
+        n = len(nfa.states)
+        k = len(nfa.letters)
+        closure = nfa2dfa.epsilon_closures(nfa)
+
+        step = [[0] * n for _ in range(k)]
+        for q, a, p in nfa.transitions():
+            step[a][q] |= closure[p]
+
+        self.start = 0
+        for q in nfa.start:
+            self.start |= closure[q]
+        self.final = 0
+        for q in range(n):
+            if nfa.final[q]:
+                self.final |= 1 << q
+
+        self.steps = step
+        self.letter_id = nfa.letter_id
+        if chunk <= 1:
+            self.chunk_tables = None
+            return
+
+        # chunk_tables[a][c][v]: union of step[a][q] for the bits q of
+        # chunk c (states c*chunk .. c*chunk+chunk-1) set in the value v
+        size = 1 << self.chunk
+        self.chunk_tables = []
+        for a in range(k):
+            chunks = []
+            for base in range(0, n, self.chunk):
+                table = [0] * size
+                for v in range(1, size):
+                    low = v & -v
+                    q = base + low.bit_length() - 1
+                    table[v] = table[v ^ low] | (step[a][q] if q < n else 0)
+                chunks.append(table)
+            self.chunk_tables.append(chunks)
+
+    def step(self, states, a):
+        res = 0
+        if self.chunk_tables is None:
+            step = self.steps[a]
+            while states:
+                low = states & -states
+                res |= step[low.bit_length() - 1]
+                states ^= low
+            return res
+        mask = (1 << self.chunk) - 1
+        for table in self.chunk_tables[a]:
+            if states & mask:
+                res |= table[states & mask]
+            states >>= self.chunk
+            if not states:
+                break
+        return res
+
+    def match(self, string):
+        # True if the whole string is accepted
+        states = self.start
+        for ch in string:
+            a = self.letter_id.get(ch)
+            if a is None:
+                return False
+            states = self.step(states, a)
+            if not states:
+                return False
+        return bool(states & self.final)
+
+    def search(self, string, start=0):
+        # Yields the end positions i such that some string[j:i], start <= j <= i,
+        # is accepted; a fresh copy of the start set enters at every position.
+        states = self.start
+        if states & self.final:
+            yield start
+        for i in range(start, len(string)):
+            a = self.letter_id.get(string[i])
+            states = self.step(states, a) if a is not None else 0
+            states |= self.start
+            if states & self.final:
+                yield i + 1
+
+    def match_file(self, path, chunk_size=1 << 16):
+        # whole-file match, read in chunks so only the state set stays in memory
+        states = self.start
+        with open(path, 'r') as f:
+            while states:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                for ch in chunk:
+                    a = self.letter_id.get(ch)
+                    if a is None:
+                        return False
+                    states = self.step(states, a)
+                    if not states:
+                        return False
+        return bool(states & self.final)
+
+    def search_file(self, path, chunk_size=1 << 16):
+        # search() over a file read in chunks, positions are character offsets
+        states = self.start
+        if states & self.final:
+            yield 0
+        offset = 0
+        with open(path, 'r') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                for i, ch in enumerate(chunk):
+                    a = self.letter_id.get(ch)
+                    states = self.step(states, a) if a is not None else 0
+                    states |= self.start
+                    if states & self.final:
+                        yield offset + i + 1
+                offset += len(chunk)
+
+
+def determinize_or_simulate(nfa, state_budget):
+    # Subset construction when it fits into state_budget DFA states,
+    # otherwise the bit-parallel simulator as a fallback.
+    nfa = faio.FA.of(nfa)
+    try:
+        return nfa2dfa.determinize(nfa, max_states=state_budget)
+    except nfa2dfa.StateBudgetExceeded:
+        return BitNFA(nfa)
+
+
+if __name__ == "__main__":
+    # usage: nfasim.py <nfa.json|nfa.fab> <input file>
+    if len(sys.argv) <= 2:
+        print("Input is incorrect")
+        sys.exit(1)
+    print(BitNFA(faio.load_nfa()).match_file(sys.argv[2]))
@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import alphabet
+import faanalysis
+import faio
+import mindfa
+import nfa2dfa
+import simulation
+
+# trimming first keeps useless NFA states out of the subset construction;
+# 'reduce' (simulation-based NFA reduction) may go in front of determinize
+DEFAULT_STEPS = ('trim', 'determinize', 'minimize')
+
+
+def determinize(fa):
+    fa = faio.FA.of(fa)
+    return fa if fa.is_deterministic() else nfa2dfa.determinize(fa)
+
+
+def minimize(fa):
+    fa = faio.FA.of(fa)
+    if not fa.is_deterministic():
+        raise ValueError("minimize needs a DFA, put determinize before it")
+    return mindfa.hopcroft_minimise(fa)
+
+
+STEPS = {
+    'determinize': determinize,
+    'trim': faanalysis.trim,
+    'reduce': simulation.reduce,
+    'minimize': minimize,
+}
+
+
+def run(fa, steps=DEFAULT_STEPS, compress_alphabet=True):
+    # fa: JSON dict or faio.FA; steps: names from STEPS or callables FA -> FA.
+    # With compress_alphabet the steps see one letter per alphabet class.
+    fa = faio.FA.of(fa)
+
+    def run_steps(fa):
+        for step in steps:
+            fa = STEPS[step](fa) if isinstance(step, str) else step(fa)
+        return fa
+
+    if compress_alphabet:
+        return alphabet.over_classes(fa, run_steps)
+    return run_steps(fa)
+
+
+def convert(src, dst, steps=DEFAULT_STEPS):
+    # load -> steps -> emit, all in this process; returns a small report
+    t = time.perf_counter()
+    fa = faio.FA.of(faio.load_fa(src))
+    before = len(fa.states)
+    fa = run(fa, steps)
+    faio.out_fa(fa, path=dst)
+    return {'src': src, 'dst': dst, 'states_in': before, 'states_out': len(fa.states),
+            'seconds': time.perf_counter() - t}
+
+
+def _convert_job(job):
+    return convert(*job)
+
+
+def convert_dir(src_dir, dst_dir, steps=DEFAULT_STEPS, workers=None, out_suffix=None):
+    # Converts every .json/.fab automaton in src_dir into dst_dir across a
+    # process pool: each worker process imports the modules once and handles
+    # many files. out_suffix ('.json' or '.fab') overrides the output format.
+    os.makedirs(dst_dir, exist_ok=True)
+    jobs = []
+    for name in sorted(os.listdir(src_dir)):
+        base, ext = os.path.splitext(name)
+        if ext not in ('.json', faio.BINARY_SUFFIX):
+            continue
+        jobs.append((os.path.join(src_dir, name),
+                     os.path.join(dst_dir, base + (out_suffix or ext)),
+                     tuple(steps)))
+    if workers == 1:
+        return [_convert_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+        return list(pool.map(_convert_job, jobs, chunksize=chunksize))
+
+
+if __name__ == "__main__":
+    # usage: pipeline.py <in file|in dir> <out file|out dir> [step,step,...] [workers]
+    if len(sys.argv) <= 2:
+        print("Input is incorrect")
+        sys.exit(1)
+    steps = sys.argv[3].split(',') if len(sys.argv) > 3 else DEFAULT_STEPS
+    for step in steps:
+        if step not in STEPS:
+            print("Unknown step:", step)
+            sys.exit(1)
+    if os.path.isdir(sys.argv[1]):
+        workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+        for report in convert_dir(sys.argv[1], sys.argv[2], steps, workers):
+            print(report)
+    else:
+        print(convert(sys.argv[1], sys.argv[2], steps))
@@ -0,0 +1,226 @@
+import sys
+from collections import deque
+
+import faio
+import mindfa
+import nfa2dfa
+
+# Product constructions explored lazily from the start pair. Either side may
+# be an NFA: it is then determinized on the fly (subset bitmasks), so only the
+# product states actually visited are ever built.
+
+OPERATIONS = {
+    'intersection': lambda x, y: x and y,
+    'union': lambda x, y: x or y,
+    'difference': lambda x, y: x and not y,
+    'symdiff': lambda x, y: x != y,
+}
+
+
+class LazyDFA(object):
+    """
+    Deterministic view of a faio automaton, stepped by letter name. A state
+    is a DFA state id, or an epsilon-closed subset bitmask for an NFA; DEAD
+    stands for "no state" (missing transitions, letters outside the own
+    alphabet), so the view is complete over any alphabet.
+    """
+    DEAD = None
+
+    def __init__(self, fa):
+        fa = faio.FA.of(fa)
+        self.fa = fa
+        self.deterministic = fa.is_deterministic()
+        if self.deterministic:
+            fa.compile_table()
+            self.start = fa.start[0] if fa.start else self.DEAD
+        else:
+            self.closure = nfa2dfa.epsilon_closures(fa)
+            self.steps = {} # (state, letter id) -> closed successor mask
+            self.start = 0
+            for q in fa.start:
+                self.start |= self.closure[q]
+            self.final_mask = 0
+            for q in range(len(fa.states)):
+                if fa.final[q]:
+                    self.final_mask |= 1 << q
+            if not self.start:
+                self.start = self.DEAD
+
+    def step(self, state, letter):
+        a = self.fa.letter_id.get(letter)
+        if state is self.DEAD or a is None:
+            return self.DEAD
+        if self.deterministic:
+            p = self.fa.delta(state, a)
+            return p if p >= 0 else self.DEAD
+        res = 0
+        rest = state
+        while rest:
+            low = rest & -rest
+            q = low.bit_length() - 1
+            key = (q, a)
+            if key not in self.steps:
+                mask = 0
+                for p in self.fa.successors(q, a):
+                    mask |= self.closure[p]
+                self.steps[key] = mask
+            res |= self.steps[key]
+            rest ^= low
+        return res if res else self.DEAD
+
+    def is_final(self, state):
+        if state is self.DEAD:
+            return False
+        if self.deterministic:
+            return bool(self.fa.final[state])
+        return bool(state & self.final_mask)
+
+
+def merged_letters(a, b):
+    return a.fa.letters + [x for x in b.fa.letters if x not in a.fa.letter_id]
+
+
+def find_witness(fa1, fa2, op='intersection'):
+    # Shortest word (list of letters) accepted by the product under op, or
+    # None if its language is empty. BFS stops at the first accepting pair.
+    accept = OPERATIONS[op]
+    a = LazyDFA(fa1)
+    b = LazyDFA(fa2)
+    letters = merged_letters(a, b)
+    start = (a.start, b.start)
+    parent = {start: None}
+    worklist = deque([start])
+    while worklist:
+        pair = worklist.popleft()
+        if accept(a.is_final(pair[0]), b.is_final(pair[1])):
+            word = []
+            while parent[pair] is not None:
+                pair, letter = parent[pair]
+                word.append(letter)
+            return word[::-1]
+        for letter in letters:
+            nxt = (a.step(pair[0], letter), b.step(pair[1], letter))
+            if nxt not in parent:
+                if op in ('intersection', 'difference') and nxt[0] is LazyDFA.DEAD:
+                    continue # nothing accepting is reachable from here
+                if op == 'intersection' and nxt[1] is LazyDFA.DEAD:
+                    continue
+                parent[nxt] = (pair, letter)
+                worklist.append(nxt)
+    return None
+
+
+def intersection_witness(fa1, fa2):
+    # None iff L(fa1) & L(fa2) is empty
+    return find_witness(fa1, fa2, 'intersection')
+
+
+def inclusion_witness(fa1, fa2):
+    # None iff L(fa1) is a subset of L(fa2), otherwise a word of L(fa1) - L(fa2)
+    return find_witness(fa1, fa2, 'difference')
+
+
+def product(fa1, fa2, op='intersection'):
+    # Materializes the reachable part of the product DFA as a faio.FA,
+    # states are named "(name1,name2)"
+    accept = OPERATIONS[op]
+    a = LazyDFA(fa1)
+    b = LazyDFA(fa2)
+    letters = merged_letters(a, b)
+
+    def name(side, state):
+        if state is LazyDFA.DEAD:
+            return '-'
+        if side.deterministic:
+            return side.fa.states[state]
+        return '_'.join(side.fa.states[q] for q in range(state.bit_length()) if state >> q & 1)
+
+    start = (a.start, b.start)
+    ids = {start: 0}
+    pairs = [start]
+    transitions = []
+    worklist = deque([0])
+    while worklist:
+        i = worklist.popleft()
+        pair = pairs[i]
+        for c, letter in enumerate(letters):
+            nxt = (a.step(pair[0], letter), b.step(pair[1], letter))
+            if nxt == (LazyDFA.DEAD, LazyDFA.DEAD):
+                continue
+            if nxt not in ids:
+                ids[nxt] = len(pairs)
+                pairs.append(nxt)
+                worklist.append(ids[nxt])
+            transitions.append((i, c, ids[nxt]))
+
+    res = faio.FA(['(%s,%s)' % (name(a, x), name(b, y)) for x, y in pairs], letters)
+    res.start = [0]
+    for i, (x, y) in enumerate(pairs):
+        res.final[i] = accept(a.is_final(x), b.is_final(y))
+    for i, c, j in transitions:
+        res.add_transition(i, c, j)
+    res.compile_table()
+    return res
+
+
+def equivalence_witness(fa1, fa2):
+    # Hopcroft-Karp: merge the start states in one union-find and keep
+    # merging successors pairwise; a class that would hold a final and a
+    # non-final state yields a distinguishing word. None iff equivalent.
+    # No minimization of either side is needed.
+    a = LazyDFA(fa1)
+    b = LazyDFA(fa2)
+    letters = merged_letters(a, b)
+    classes = mindfa.DisjointSet([])
+    start = (('a', a.start), ('b', b.start))
+    for item in start:
+        classes.add(item)
+    classes.union(*start)
+    # queued pairs as (pair, parent index, letter); every merge queues one
+    # pair, and the word is read back along the parents
+    pairs = [(start, None, None)]
+    worklist = deque([0])
+    while worklist:
+        i = worklist.popleft()
+        x, y = pairs[i][0]
+        if a.is_final(x[1]) != b.is_final(y[1]):
+            word = []
+            while pairs[i][1] is not None:
+                _, i, letter = pairs[i]
+                word.append(letter)
+            return word[::-1]
+        for letter in letters:
+            nx = ('a', a.step(x[1], letter))
+            ny = ('b', b.step(y[1], letter))
+            classes.add(nx)
+            classes.add(ny)
+            if not classes.connected(nx, ny):
+                classes.union(nx, ny)
+                worklist.append(len(pairs))
+                pairs.append(((nx, ny), i, letter))
+    return None
+
+
+if __name__ == "__main__":
+    # usage: product.py <A> <B> empty|included|equivalent
+    #        product.py <A> <B> intersection|union|difference|symdiff <out>
+    if len(sys.argv) <= 3:
+        print("Input is incorrect")
+        sys.exit(1)
+    fa1 = faio.load_fa(sys.argv[1])
+    fa2 = faio.load_fa(sys.argv[2])
+    check = sys.argv[3]
+    if check == 'empty':
+        word = intersection_witness(fa1, fa2)
+        print("L(A) & L(B) is empty" if word is None else "common word: %r" % ''.join(word))
+    elif check == 'included':
+        word = inclusion_witness(fa1, fa2)
+        print("L(A) <= L(B)" if word is None else "in A, not in B: %r" % ''.join(word))
+    elif check == 'equivalent':
+        word = equivalence_witness(fa1, fa2)
+        print("L(A) == L(B)" if word is None else "distinguishing word: %r" % ''.join(word))
+    elif check in OPERATIONS and len(sys.argv) > 4:
+        faio.out_fa(product(fa1, fa2, check), path=sys.argv[4])
+    else:
+        print("Input is incorrect")
+        sys.exit(1)
@@ -0,0 +1,227 @@
+import sys
+
+import alphabet
+import faio
+
+try:
+    import numpy as np
+except ImportError: # numpy is only needed by the batch recognizer
+    np = None
+
+
+class CompiledDFA(object):
+    """
+    DFA compiled for recognition over its alphabet classes (see alphabet.py):
+    a dense (n+1) x (c+2) int32 matrix for c letter classes, where row n is a
+    dead state, column c is "any character outside the alphabet" (goes to
+    the dead state) and column c+1 is padding (stays in place), so ragged
+    inputs can be advanced together in one padded matrix.
+    Single-character letters are reachable from text through char_map
+    (code point -> class id); other letters only through encoded inputs,
+    where class_of maps letter ids to class ids.
+    """
+    def __init__(self, fa, char_map_size=65536):
+        if np is None:
+            raise ImportError("numpy is required for CompiledDFA")
+        fa = faio.FA.of(fa)
+        if not fa.is_deterministic():
+            raise ValueError("automaton is not deterministic, run nfa2dfa first")
+        n = len(fa.states)
+        char_map, members = alphabet.char_class_map(fa, char_map_size)
+        c = len(members)
+        self.fa = fa
+        self.dead = n
+        self.unknown = c
+        self.pad = c + 1
+        self.class_of = np.zeros(len(fa.letters), dtype=np.int32)
+        for i, m in enumerate(members):
+            self.class_of[m] = i
+
+        table = np.full((n + 1, c + 2), n, dtype=np.int32)
+        if n:
+            known = fa.numpy_table()[:, [m[0] for m in members]]
+            table[:n, :c] = np.where(known < 0, n, known)
+        table[:, self.pad] = np.arange(n + 1, dtype=np.int32)
+        self.table = table
+
+        self.accept = np.zeros(n + 1, dtype=bool)
+        self.accept[:n] = np.frombuffer(bytes(fa.final), dtype=np.uint8).astype(bool)
+        self.start = fa.start[0] if fa.start else self.dead
+
+        # the last entry catches every code point past the map
+        self.char_map = np.append(np.array(char_map, dtype=np.int32), np.int32(self.unknown))
+
+    def encode(self, strings):
+        # list of str (or bytes) -> padded (len(strings), max length) matrix of class ids
+        lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+        width = int(lengths.max()) if len(strings) else 0
+        res = np.full((len(strings), width), self.pad, dtype=np.int32)
+        if not width:
+            return res
+        if isinstance(strings[0], (bytes, bytearray)):
+            codes = np.frombuffer(b''.join(strings), dtype=np.uint8)
+        else:
+            codes = np.frombuffer(''.join(strings).encode('utf-32-le'), dtype=np.uint32)
+        codes = self.char_map[np.minimum(codes.astype(np.int64), len(self.char_map) - 1)]
+        res[np.arange(width) < lengths[:, None]] = codes # row-major, so in input order
+        return res
+
+    def recognize_batch(self, inputs, trace=None):
+        """
+        inputs: list of str/bytes, or an already encoded padded matrix of
+        class ids (pad with self.pad). Returns a bool acceptance vector.
+        trace, if given, is called as trace(position, states) after every step.
+        """
+        if not isinstance(inputs, np.ndarray):
+            inputs = self.encode(inputs)
+        states = np.full(inputs.shape[0], self.start, dtype=np.int32)
+        for j in range(inputs.shape[1]):
+            states = self.table[states, inputs[:, j]]
+            if trace is not None:
+                trace(j, states)
+        return self.accept[states]
+
+
+def recognize_batch(fa, inputs, trace=None):
+    return CompiledDFA(fa).recognize_batch(inputs, trace)
+
+
+class StreamRecognizer(object):
+    """
+    Resumable DFA recognizer: feed() consumes chunks (str, or any bytes-like
+    object) and keeps the current state between calls, finish() tells
+    whether everything fed so far is accepted. scan() also reports every
+    accepting position, i.e. the offsets i with input[:i] accepted.
+    Works over the alphabet classes; bytes chunks are mapped to classes
+    with bytes.translate. trace, if given, is called as
+    trace(offset, state, class id, new state) for every transition.
+    """
+    def __init__(self, fa, trace=None, char_map_size=65536):
+        fa = faio.FA.of(fa)
+        if not fa.is_deterministic():
+            raise ValueError("automaton is not deterministic, run nfa2dfa first")
+        fa.compile_table()
+        char_map, members = alphabet.char_class_map(fa, char_map_size)
+        c = len(members)
+        self.fa = fa
+        self.trace = trace
+        self.width = c + 1 # the last column is "outside the alphabet", always -1
+        self.table = []
+        for q in range(len(fa.states)):
+            self.table += [fa.delta(q, m[0]) for m in members] + [-1]
+        self.accept = bytes(fa.final)
+        self.char_map = list(char_map)
+        self.byte_map = bytes(char_map[:256]) if c < 256 else None
+        self.start = fa.start[0] if fa.start else -1
+        self.reset()
+
+    def reset(self):
+        self.state = self.start
+        self.offset = 0
+        self.start_reported = False # position 0 comes once, even after empty chunks
+
+    def classes(self, chunk):
+        if isinstance(chunk, str):
+            size = len(self.char_map)
+            other = self.width - 1
+            return [self.char_map[o] if o < size else other for o in map(ord, chunk)]
+        if self.byte_map is not None:
+            return bytes(chunk).translate(self.byte_map)
+        return [self.char_map[b] for b in bytes(chunk)]
+
+    def feed(self, chunk):
+        s = self.state
+        if s >= 0:
+            table = self.table
+            width = self.width
+            if self.trace is None:
+                for c in self.classes(chunk):
+                    s = table[s * width + c]
+                    if s < 0:
+                        break
+            else:
+                for i, c in enumerate(self.classes(chunk)):
+                    prev, s = s, table[s * width + c]
+                    self.trace(self.offset + i, prev, c, s)
+                    if s < 0:
+                        break
+            self.state = s
+        self.offset += len(chunk)
+        return self
+
+    def scan(self, chunk):
+        # like feed(), returns the accepting positions reached in this chunk
+        res = []
+        if not self.start_reported and self.offset == 0 and self.state >= 0 and self.accept[self.state]:
+            res.append(0)
+        self.start_reported = True
+        s = self.state
+        if s >= 0:
+            table = self.table
+            width = self.width
+            accept = self.accept
+            offset = self.offset + 1
+            for i, c in enumerate(self.classes(chunk)):
+                prev, s = s, table[s * width + c]
+                if self.trace is not None:
+                    self.trace(offset + i - 1, prev, c, s)
+                if s < 0:
+                    break
+                if accept[s]:
+                    res.append(offset + i)
+            self.state = s
+        self.offset += len(chunk)
+        return res
+
+    def finish(self):
+        return self.state >= 0 and self.accept[self.state] == 1
+
+    def feed_iter(self, chunks):
+        for chunk in chunks:
+            self.feed(chunk)
+            if self.state < 0:
+                break # dead: nothing more can be accepted
+        return self.finish()
+
+    def scan_iter(self, chunks):
+        empty = True
+        for chunk in chunks:
+            empty = False
+            for pos in self.scan(chunk):
+                yield pos
+        if empty: # still report the empty prefix
+            for pos in self.scan(''):
+                yield pos
+
+
+def iter_chunks(source, chunk_size=1 << 20):
+    # chunks of a file object, a path, or a buffer such as an mmap
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            for chunk in iter_chunks(f, chunk_size):
+                yield chunk
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        for i in range(0, len(source), chunk_size):
+            yield source[i:i + chunk_size]
+
+
+if __name__ == "__main__":
+    # usage: recognize.py <dfa.json|dfa.fab> <strings.txt>, one string per line
+    #        recognize.py <dfa.json|dfa.fab> <file> stream: the whole file as one input
+    if len(sys.argv) <= 2:
+        print("Input is incorrect")
+        sys.exit(1)
+    dfa = faio.load_dfa()
+    if len(sys.argv) > 3 and sys.argv[3] == 'stream':
+        print(StreamRecognizer(dfa).feed_iter(iter_chunks(sys.argv[2])))
+        sys.exit(0)
+    with open(sys.argv[2], 'r') as inp:
+        strings = inp.read().splitlines()
+    for string, accepted in zip(strings, recognize_batch(dfa, strings)):
+        print(string, accepted)
@@ -0,0 +1,379 @@
+import sys
+from collections import OrderedDict, deque
+
+import faio
+
+# Regex front end with a lazily built DFA. DFA states are regexes and the
+# transition by c goes to the Brzozowski derivative d_c(r); regexes are
+# hash-consed into int ids and normalised by the smart constructors (ACI for
+# |, unit/zero laws, ** = *), so equal derivatives meet in the same state and
+# only the states actually visited by the input are ever built.
+#
+# Syntax: a  \a  .  [abc] [a-z] [^...]  (r)  r|s  rs  r*  r+  r?
+
+EMPTY, EPS, SET, CAT, ALT, STAR = range(6)
+
+
+class Terms(object):
+    """Hash-consed regex terms: a term is an int id, nodes[id] = (kind, args)."""
+    def __init__(self):
+        self.nodes = []
+        self.ids = {}
+        self.nullable = []
+        self.empty = self.make(EMPTY, ())
+        self.eps = self.make(EPS, ())
+
+    def make(self, kind, args):
+        key = (kind, args)
+        r = self.ids.get(key)
+        if r is None:
+            r = self.ids[key] = len(self.nodes)
+            self.nodes.append(key)
+            if kind == EPS or kind == STAR:
+                self.nullable.append(True)
+            elif kind == CAT:
+                self.nullable.append(self.nullable[args[0]] and self.nullable[args[1]])
+            elif kind == ALT:
+                self.nullable.append(any(self.nullable[x] for x in args))
+            else:
+                self.nullable.append(False)
+        return r
+
+    # smart constructors
+
+    def chars(self, chars, negated=False):
+        if not chars and not negated:
+            return self.empty
+        return self.make(SET, (frozenset(chars), negated))
+
+    def cat(self, a, b):
+        if a == self.empty or b == self.empty:
+            return self.empty
+        if a == self.eps:
+            return b
+        if b == self.eps:
+            return a
+        kind, args = self.nodes[a]
+        if kind == CAT: # keep concatenations right-nested
+            return self.cat(args[0], self.cat(args[1], b))
+        return self.make(CAT, (a, b))
+
+    def alt(self, *terms):
+        flat = set()
+        for r in terms:
+            kind, args = self.nodes[r]
+            if kind == ALT:
+                flat.update(args)
+            elif r != self.empty:
+                flat.add(r)
+        if not flat:
+            return self.empty
+        if len(flat) == 1:
+            return flat.pop()
+        return self.make(ALT, frozenset(flat))
+
+    def star(self, r):
+        kind, args = self.nodes[r]
+        if kind == STAR:
+            return r
+        if r == self.empty or r == self.eps:
+            return self.eps
+        return self.make(STAR, (r,))
+
+    def matches(self, r, c):
+        chars, negated = self.nodes[r][1]
+        return (c in chars) != negated
+
+    def derivative(self, r, c):
+        # Brzozowski derivative d_c(r)
+        kind, args = self.nodes[r]
+        if kind == SET:
+            return self.eps if self.matches(r, c) else self.empty
+        if kind == CAT:
+            d = self.cat(self.derivative(args[0], c), args[1])
+            if self.nullable[args[0]]:
+                d = self.alt(d, self.derivative(args[1], c))
+            return d
+        if kind == ALT:
+            return self.alt(*[self.derivative(x, c) for x in args])
+        if kind == STAR:
+            return self.cat(self.derivative(args[0], c), r)
+        return self.empty
+
+    def partial_derivatives(self, r, c):
+        # Antimirov partial derivatives: a set of terms whose union is d_c(r),
+        # i.e. the successors of r in an NFA with at most |r| + 1 states
+        kind, args = self.nodes[r]
+        if kind == SET:
+            return {self.eps} if self.matches(r, c) else set()
+        if kind == CAT:
+            res = {self.cat(t, args[1]) for t in self.partial_derivatives(args[0], c)}
+            if self.nullable[args[0]]:
+                res |= self.partial_derivatives(args[1], c)
+            return res
+        if kind == ALT:
+            res = set()
+            for x in args:
+                res |= self.partial_derivatives(x, c)
+            return res
+        if kind == STAR:
+            return {self.cat(t, r) for t in self.partial_derivatives(args[0], c)}
+        return set()
+
+    def letters(self, r, seen=None):
+        # characters mentioned in r; negated sets contribute their exceptions
+        seen = set() if seen is None else seen
+        res = set()
+        stack = [r]
+        while stack:
+            x = stack.pop()
+            if x in seen:
+                continue
+            seen.add(x)
+            kind, args = self.nodes[x]
+            if kind == SET:
+                res |= args[0]
+            elif kind == ALT:
+                stack.extend(args)
+            elif kind in (CAT, STAR):
+                stack.extend(args)
+        return res
+
+    def to_string(self, r):
+        kind, args = self.nodes[r]
+        if kind == EMPTY:
+            return '[]'
+        if kind == EPS:
+            return '()'
+        if kind == SET:
+            chars, negated = args
+            if len(chars) == 1 and not negated:
+                c = next(iter(chars))
+                return '\\' + c if c in SPECIAL else c
+            if not chars and negated:
+                return '.'
+            return '[%s%s]' % ('^' if negated else '', ''.join(sorted(chars)))
+        if kind == CAT:
+            return ''.join(self._atom(x) if self.nodes[x][0] == ALT else self.to_string(x) for x in args)
+        if kind == ALT:
+            return '|'.join(sorted(self.to_string(x) for x in args))
+        return self._atom(args[0]) + '*'
+
+    def _atom(self, r):
+        s = self.to_string(r)
+        return s if len(s) == 1 or self.nodes[r][0] == SET else '(' + s + ')'
+
+
+SPECIAL = set('|*+?()[].\\')
+
+
+class Parser(object):
+    # recursive descent: alt := cat ('|' cat)*, cat := rep*, rep := atom [*+?]*
+    def __init__(self, terms, pattern):
+        self.terms = terms
+        self.pattern = pattern
+        self.pos = 0
+
+    def parse(self):
+        r = self.alt()
+        if self.pos != len(self.pattern):
+            raise ValueError("unexpected %r at %d" % (self.pattern[self.pos], self.pos))
+        return r
+
+    def peek(self):
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+    def take(self):
+        c = self.pattern[self.pos]
+        self.pos += 1
+        return c
+
+    def escaped(self):
+        # the character after a backslash
+        if self.pos >= len(self.pattern):
+            raise ValueError("dangling \\ at %d" % (self.pos - 1))
+        return self.take()
+
+    def alt(self):
+        res = [self.cat()]
+        while self.peek() == '|':
+            self.take()
+            res.append(self.cat())
+        return self.terms.alt(*res)
+
+    def cat(self):
+        res = self.terms.eps
+        parts = []
+        while self.peek() is not None and self.peek() not in '|)':
+            parts.append(self.rep())
+        for r in reversed(parts):
+            res = self.terms.cat(r, res)
+        return res
+
+    def rep(self):
+        r = self.atom()
+        while self.peek() is not None and self.peek() in '*+?':
+            op = self.take()
+            if op == '*':
+                r = self.terms.star(r)
+            elif op == '+':
+                r = self.terms.cat(r, self.terms.star(r))
+            else:
+                r = self.terms.alt(r, self.terms.eps)
+        return r
+
+    def atom(self):
+        c = self.take()
+        if c == '(':
+            r = self.alt()
+            if self.peek() != ')':
+                raise ValueError("missing ) at %d" % self.pos)
+            self.take()
+            return r
+        if c == '[':
+            return self.char_class()
+        if c == '.':
+            return self.terms.chars((), negated=True)
+        if c == '\\':
+            return self.terms.chars(self.escaped())
+        if c in SPECIAL:
+            raise ValueError("unexpected %r at %d" % (c, self.pos - 1))
+        return self.terms.chars(c)
+
+    def char_class(self):
+        negated = self.peek() == '^'
+        if negated:
+            self.take()
+        chars = set()
+        while self.peek() != ']':
+            if self.peek() is None:
+                raise ValueError("missing ]")
+            c = self.take()
+            if c == '\\':
+                c = self.escaped()
+            if self.peek() == '-' and self.pos + 1 < len(self.pattern) and self.pattern[self.pos + 1] != ']':
+                self.take()
+                hi = self.take()
+                chars.update(chr(x) for x in range(ord(c), ord(hi) + 1))
+            else:
+                chars.add(c)
+        self.take()
+        return self.terms.chars(chars, negated)
+
+
+class Regex(object):
+    """
+    Compiled pattern matched by a lazy DFA. Discovered states keep their
+    transition rows in an LRU cache of at most cache_size states. When a
+    single match evicts more than cache_size states the cache is thrashing,
+    and the rest of that input is matched by Antimirov partial-derivative
+    NFA simulation instead, which builds no DFA states at all.
+    Evicted states stay in the term table, so that is bounded as well: once
+    a match adds more than term_limit terms (default 16 * cache_size), the
+    table and the cache are dropped for a new generation and the input is
+    matched by simulation from the start. Simulation only creates partial
+    derivatives of the pattern, of which there are at most |pattern| + 1.
+    """
+    def __init__(self, pattern, cache_size=10000, term_limit=None):
+        self.pattern = pattern
+        self.cache_size = cache_size
+        self.term_limit = 16 * cache_size if term_limit is None else term_limit
+        self.stats = {'states': 0, 'evictions': 0, 'fallbacks': 0, 'resets': 0}
+        self.reset()
+
+    def reset(self):
+        # new term table generation with an empty state cache
+        self.terms = Terms()
+        self.start = Parser(self.terms, self.pattern).parse()
+        self.cache = OrderedDict() # state -> {char: state}
+        self.max_terms = len(self.terms.nodes) + self.term_limit
+
+    def row(self, state):
+        row = self.cache.get(state)
+        if row is None:
+            row = self.cache[state] = {}
+            self.stats['states'] += 1
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+                self.stats['evictions'] += 1
+        else:
+            self.cache.move_to_end(state)
+        return row
+
+    def step(self, state, c):
+        row = self.row(state)
+        nxt = row.get(c)
+        if nxt is None:
+            nxt = row[c] = self.terms.derivative(state, c)
+        return nxt
+
+    def match(self, string):
+        # True if the whole string matches
+        state = self.start
+        evictions = self.stats['evictions']
+        for i, c in enumerate(string):
+            state = self.step(state, c)
+            if state == self.terms.empty:
+                return False
+            if len(self.terms.nodes) > self.max_terms:
+                self.stats['fallbacks'] += 1
+                self.stats['resets'] += 1
+                self.reset()
+                return self.simulate({self.start}, string)
+            if self.stats['evictions'] - evictions > self.cache_size:
+                self.stats['fallbacks'] += 1
+                return self.simulate({state}, string, i + 1)
+        return self.terms.nullable[state]
+
+    def simulate(self, states, string, pos=0):
+        # Antimirov NFA simulation from a set of terms
+        terms = self.terms
+        for c in string[pos:]:
+            nxt = set()
+            for r in states:
+                nxt |= terms.partial_derivatives(r, c)
+            states = nxt
+            if not states:
+                return False
+        return any(terms.nullable[r] for r in states)
+
+    def to_fa(self, letters=None, max_states=None):
+        # Materializes the full DFA over letters (default: the characters in
+        # the pattern) as a faio.FA; the dead state is left out
+        terms = self.terms
+        if letters is None:
+            letters = sorted(terms.letters(self.start))
+        ids = {self.start: 0}
+        states = [self.start]
+        transitions = []
+        worklist = deque([0])
+        while worklist:
+            i = worklist.popleft()
+            for a, c in enumerate(letters):
+                nxt = self.step(states[i], c)
+                if nxt == terms.empty:
+                    continue
+                if nxt not in ids:
+                    if max_states is not None and len(states) >= max_states:
+                        raise ValueError("more than %d DFA states" % max_states)
+                    ids[nxt] = len(states)
+                    states.append(nxt)
+                    worklist.append(ids[nxt])
+                transitions.append((i, a, ids[nxt]))
+        fa = faio.FA([terms.to_string(r) for r in states], letters)
+        fa.start = [0] if self.start != terms.empty else []
+        for i, r in enumerate(states):
+            fa.final[i] = terms.nullable[r]
+        for i, a, j in transitions:
+            fa.add_transition(i, a, j)
+        fa.compile_table()
+        return fa
+
+
+if __name__ == "__main__":
+    # usage: regex_deriv.py <pattern> <out.json|out.fab> [letters]: write the DFA
+    if len(sys.argv) <= 2:
+        print("Input is incorrect")
+        sys.exit(1)
+    regex = Regex(sys.argv[1])
+    faio.out_fa(regex.to_fa(list(sys.argv[3]) if len(sys.argv) > 3 else None))
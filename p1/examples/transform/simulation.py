@@ -0,0 +1,197 @@
+import faanalysis
+import faio
+import nfa2dfa
+
+# Simulation preorders on an NFA. p simulates q (q <= p) if p is final
+# whenever q is and every move q -a-> q' is matched by a move p -a-> p'
+# with q' <= p'; then L(q) is a subset of L(p). Backward simulation is the
+# same on the reversed automaton with start states as the final ones.
+# A relation is kept as a list of int bitmasks, up[q] = the states
+# simulating q (q itself included).
+# Epsilon-transitions are removed first (nfa2dfa.remove_epsilon keeps the
+# state ids), so the preorders hold for the original states as well.
+
+
+def predecessors(fa):
+    # pred[a][p]: bitmask of the states with an a-transition to p
+    pred = [[0] * len(fa.states) for _ in fa.letters]
+    for q, a, p in fa.transitions():
+        pred[a][p] |= 1 << q
+    return pred
+
+
+def pre_image(pred_a, mask):
+    res = 0
+    while mask:
+        low = mask & -mask
+        res |= pred_a[low.bit_length() - 1]
+        mask ^= low
+    return res
+
+
+def largest_simulation(n, k, moves, accepting):
+    # Largest relation with: p is accepting if q is, and every move
+    # q -a-> q2 is matched by some p -a-> p2 with p2 simulating q2; found by
+    # refinement from "p is accepting if q is and has moves on q's letters"
+    moves = list(moves)
+    pred = [[0] * n for _ in range(k)]
+    has_letter = [0] * k # states with some a-move
+    letters = [set() for _ in range(n)]
+    for q, a, p in moves:
+        pred[a][p] |= 1 << q
+        has_letter[a] |= 1 << q
+        letters[q].add(a)
+    accepting_mask = 0
+    for q in range(n):
+        if accepting[q]:
+            accepting_mask |= 1 << q
+    everyone = (1 << n) - 1
+    up = []
+    for q in range(n):
+        mask = accepting_mask if accepting[q] else everyone
+        for a in letters[q]:
+            mask &= has_letter[a]
+        up.append(mask)
+
+    changed = True
+    while changed:
+        changed = False
+        for q, a, q2 in moves:
+            # p may simulate q only if some a-successor of p simulates q2
+            mask = up[q] & pre_image(pred[a], up[q2])
+            if mask != up[q]:
+                up[q] = mask
+                changed = True
+    return up
+
+
+def forward_simulation(fa):
+    fa = nfa2dfa.remove_epsilon(fa)
+    return largest_simulation(len(fa.states), len(fa.letters), fa.transitions(), fa.final)
+
+
+def backward_simulation(fa):
+    # p backward-simulates q if start states reach p by every word they
+    # reach q by: moves are reversed and start states play the final ones
+    fa = nfa2dfa.remove_epsilon(fa)
+    start = bytearray(len(fa.states))
+    for q in fa.start:
+        start[q] = 1
+    return largest_simulation(len(fa.states), len(fa.letters),
+                              ((p, a, q) for q, a, p in fa.transitions()), start)
+
+
+def simulates(up, big, small):
+    # big <=forall-exists small for subset bitmasks: every state of small
+    # is simulated by some state of big (for plain subsets, small <= big)
+    while small:
+        low = small & -small
+        if not up[low.bit_length() - 1] & big:
+            return False
+        small ^= low
+    return True
+
+
+def maximal_states(up, mask):
+    # drops the states of mask simulated by another one of mask (of two
+    # mutually similar states the higher id is kept)
+    res = mask
+    rest = mask
+    while rest:
+        low = rest & -rest
+        q = low.bit_length() - 1
+        bigger = up[q] & res & ~low
+        if bigger:
+            res ^= low
+        rest ^= low
+    return res
+
+
+def equivalence_classes(up):
+    # classes of mutual simulation, as lists of states
+    n = len(up)
+    cls = [-1] * n
+    res = []
+    for q in range(n):
+        if cls[q] < 0:
+            members = [p for p in range(n) if up[q] >> p & 1 and up[p] >> q & 1]
+            for p in members:
+                cls[p] = len(res)
+            res.append(members)
+    return cls, res
+
+
+def quotient(fa, up):
+    # merges mutually similar states (forward or backward); a class is a
+    # start (final) state if one of its members is
+    cls, classes = equivalence_classes(up)
+    res = faio.FA([[fa.states[q] for q in members] for members in classes], fa.letters)
+    res.start = sorted(set(cls[q] for q in fa.start))
+    for q in range(len(fa.states)):
+        if fa.final[q]:
+            res.final[cls[q]] = 1
+    for q, a, p in fa.transitions():
+        res.add_transition(cls[q], a, cls[p])
+    return res
+
+
+def strictly_below(up, q, p):
+    return up[q] >> p & 1 and not up[p] >> q & 1
+
+
+def prune_forward(fa, up):
+    # drops q -a-> p when q -a-> p2 with p strictly below p2 exists (a
+    # "little brother"), and start states strictly below another start state
+    res = faio.FA(fa.states, fa.letters)
+    res.start = [q for q in fa.start if not any(strictly_below(up, q, p) for p in fa.start)]
+    res.final = bytearray(fa.final)
+    for q, row in enumerate(fa.succ):
+        for a, dsts in row.items():
+            for p in dsts:
+                if not any(strictly_below(up, p, p2) for p2 in dsts):
+                    res.add_transition(q, a, p)
+    return res
+
+
+def prune_backward(fa, up):
+    # the mirror image: drops q -a-> p when q2 -a-> p with q strictly below
+    # q2 exists, and final marks of states strictly below another final one
+    preds = {}
+    for q, a, p in fa.transitions():
+        preds.setdefault((p, a), []).append(q)
+    res = faio.FA(fa.states, fa.letters)
+    res.start = list(fa.start)
+    finals = [q for q in range(len(fa.states)) if fa.final[q]]
+    for q in finals:
+        if not any(strictly_below(up, q, p) for p in finals):
+            res.final[q] = 1
+    for (p, a), srcs in preds.items():
+        for q in srcs:
+            if not any(strictly_below(up, q, q2) for q2 in srcs):
+                res.add_transition(q, a, p)
+    return res
+
+
+def reduce(fa):
+    # Language-preserving NFA reduction: quotient by forward simulation
+    # equivalence, prune forward little brothers, then the same backward,
+    # and trim. Every step recomputes its simulation, since pruning with two
+    # relations computed on the same automaton would not be sound.
+    fa = nfa2dfa.remove_epsilon(fa)
+    fa = quotient(fa, forward_simulation(fa))
+    fa = prune_forward(fa, forward_simulation(fa))
+    fa = quotient(fa, backward_simulation(fa))
+    fa = prune_backward(fa, backward_simulation(fa))
+    fa = faanalysis.trim(fa)
+    if fa.is_deterministic():
+        fa.compile_table()
+    return fa
+
+
+if __name__ == "__main__":
+    # usage: simulation.py <in.json|in.fab> <out.json|out.fab>: write the reduced NFA
+    fa = faio.FA.of(faio.load_fa())
+    res = reduce(fa)
+    print("states: %d -> %d, transitions: %d -> %d" % (len(fa.states), len(res.states),
+          len(list(fa.transitions())) + len(list(fa.eps_transitions())), len(list(res.transitions()))))
+    faio.out_fa(res)
@@ -1,5 +1,16 @@
 import copy
 
+from Hellings import grammar_index, matrix_edges
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+
 G={
     'A':[['a']],
     'B':[['d']],
@@ -8,6 +19,7 @@ G={
     'E':[['B','C']],
     'S':[['D','E']]
  }
+DEFAULT_GRAMMAR = G
 
 
 def search_lhs_non_terminal_rule(first, second):
@@ -98,6 +110,277 @@ def CYK_graph(M, G = None, log=True):
             logM(M, prefix_msg="M after current pass:")
 
 
+# Matrix CFPQ (Azimov): one boolean n x n matrix T[A] per nonterminal,
+# T[A][u][v] <=> A derives the word of some path u -> v. The fixpoint applies
+# T[A] |= T[B] . T[C] for every rule A -> B C until no matrix changes, so the
+# work is in vectorized boolean products: scipy.sparse CSR when scipy is
+# installed, dense NumPy bool arrays otherwise.
+
+def bool_matrix(n, pairs):
+    if np is None:
+        raise ImportError("numpy (and preferably scipy) is required for the matrix mode")
+    pairs = list(pairs)
+    rows = np.array([u for u, v in pairs], dtype=np.int64)
+    cols = np.array([v for u, v in pairs], dtype=np.int64)
+    return bool_matrix_arrays(n, rows, cols)
+
+
+def bool_matrix_arrays(n, rows, cols):
+    if sp is not None:
+        return sp.csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(n, n), dtype=bool)
+    res = np.zeros((n, n), dtype=bool)
+    res[rows, cols] = True
+    return res
+
+
+def graph_matrices(graph, terminal, nonterms):
+    # initial matrices straight from the CSR arrays of a graph_io.CSRGraph,
+    # one vectorized selection per label instead of a loop over the edges
+    if np is None:
+        raise ImportError("numpy (and preferably scipy) is required for the matrix mode")
+    indptr = np.asarray(graph.indptr, dtype=np.int64)
+    rows = np.repeat(np.arange(graph.n, dtype=np.int64), np.diff(indptr))
+    cols = np.asarray(graph.targets, dtype=np.int64)
+    labels = np.asarray(graph.edge_labels)
+    T = {}
+    for a, label in enumerate(graph.labels):
+        heads = terminal.get(label, ())
+        if not heads:
+            continue
+        sel = labels == a
+        m = bool_matrix_arrays(graph.n, rows[sel], cols[sel])
+        for N in heads:
+            T[N] = bool_or(T[N], m) if N in T else m
+    empty = np.zeros(0, dtype=np.int64)
+    for N in nonterms:
+        if N not in T:
+            T[N] = bool_matrix_arrays(graph.n, empty, empty)
+    return T
+
+
+def count_true(T):
+    return int(T.count_nonzero() if sp is not None and sp.issparse(T) else np.count_nonzero(T))
+
+
+def bool_or(X, Y):
+    return X + Y if sp is not None and sp.issparse(X) else X | Y
+
+
+def bool_diff(X, Y):
+    # X and not Y
+    return X > Y if sp is not None and sp.issparse(X) else X & ~Y
+
+
+def matrix_grammar(G):
+    terminal, binary, eps = grammar_index(G)
+    nonterms = set(G)
+    for (B, C), heads in binary.items():
+        nonterms.update([B, C])
+    return terminal, binary, eps, nonterms
+
+
+def initial_matrices(edges, n, terminal, nonterms):
+    # T[N] from the terminal rules N -> a only
+    if hasattr(edges, 'indptr'): # graph_io.CSRGraph
+        return graph_matrices(edges, terminal, nonterms)
+    pairs = {N: [] for N in nonterms}
+    for u, label, v in edges:
+        for N in terminal.get(label, ()):
+            pairs[N].append((u, v))
+    return {N: bool_matrix(n, pairs[N]) for N in nonterms}
+
+
+def cfpq_matrix(edges, n, G, log=False, semi_naive=False, stats=None):
+    # dict nonterminal -> boolean matrix; edges are (u, label, v) triples or
+    # a graph_io.CSRGraph. With semi_naive each round only
+    # multiplies what the previous round derived: T[A] |= dB . T[C] + T[B] . dC,
+    # and stops when every delta is empty. stats, if a list, gets one
+    # {nonterminal: number of new pairs} dict per round.
+    terminal, binary, eps, nonterms = matrix_grammar(G)
+    T = initial_matrices(edges, n, terminal, nonterms)
+    loops = np.arange(n, dtype=np.int64)
+    for N in eps:
+        T[N] = bool_or(T[N], bool_matrix_arrays(n, loops, loops))
+    size = {N: count_true(T[N]) for N in nonterms}
+
+    if semi_naive:
+        delta = {N: T[N] for N in nonterms if size[N]}
+    changed = True
+    iteration = 0
+    while changed:
+        changed = False
+        iteration += 1
+        before = dict(size)
+        if semi_naive:
+            # new pairs go into T at once and into the next round's delta;
+            # later rules of the same round already use them as delta too
+            next_delta = {}
+
+            def current_delta(N):
+                if N in delta and N in next_delta:
+                    return bool_or(delta[N], next_delta[N])
+                return delta.get(N, next_delta.get(N))
+
+            for (B, C), heads in binary.items():
+                prod = None
+                dB = current_delta(B)
+                dC = current_delta(C)
+                if dB is not None and size[C]:
+                    prod = dB @ T[C]
+                if size[B] and dC is not None:
+                    part = T[B] @ dC
+                    prod = part if prod is None else bool_or(prod, part)
+                if prod is None:
+                    continue
+                for A in heads:
+                    d = bool_diff(prod, T[A])
+                    d_size = count_true(d)
+                    if d_size:
+                        T[A] = bool_or(T[A], d)
+                        size[A] += d_size
+                        next_delta[A] = d if A not in next_delta else bool_or(next_delta[A], d)
+                        changed = True
+            delta = next_delta
+        else:
+            for (B, C), heads in binary.items():
+                if not size[B] or not size[C]:
+                    continue
+                prod = T[B] @ T[C]
+                for A in heads:
+                    new = bool_or(T[A], prod)
+                    new_size = count_true(new)
+                    if new_size != size[A]:
+                        T[A] = new
+                        size[A] = new_size
+                        changed = True
+        if stats is not None:
+            stats.append({N: size[N] - before[N] for N in sorted(nonterms)})
+        if log:
+            print("iteration %d:" % iteration, {N: size[N] for N in sorted(nonterms)})
+    return T
+
+
+def nonzero_columns(X):
+    if sp is not None and sp.issparse(X):
+        return np.unique(X.nonzero()[1])
+    return np.nonzero(X.any(axis=0))[0]
+
+
+def cfpq_matrix_query(edges, n, G, sources, start='S', target=None, log=False):
+    # Multiple-source matrix CFPQ: Src[A] is a diagonal matrix of the
+    # vertices where A is demanded, T[A] only gets the rows of those. For
+    # A -> B C: Src[B] |= Src[A], Src[C] gets the ends of Src[A] . T[B], and
+    # T[A] |= Src[A] . T[B] . T[C]; terminal rules give Src[A] . E[A].
+    # Returns the set of (s, v) with s in sources derived from start, or with
+    # target set a bool, as soon as some (start, s, target) is derived.
+    terminal, binary, eps, nonterms = matrix_grammar(G)
+    E = initial_matrices(edges, n, terminal, nonterms)
+    sources = sorted(set(sources))
+    empty = np.zeros(0, dtype=np.int64)
+    Src = {N: bool_matrix_arrays(n, empty, empty) for N in nonterms}
+    idx = np.array(sources, dtype=np.int64)
+    Src[start] = bool_matrix_arrays(n, idx, idx)
+    T = {N: bool_matrix_arrays(n, empty, empty) for N in nonterms}
+    src_size = {N: count_true(Src[N]) for N in nonterms}
+    size = {N: 0 for N in nonterms}
+
+    def found():
+        return target is not None and any(T[start][s, target] for s in sources)
+
+    def grow(N, X):
+        new = bool_or(T[N], X)
+        new_size = count_true(new)
+        if new_size == size[N]:
+            return False
+        T[N] = new
+        size[N] = new_size
+        return True
+
+    def demand(N, X):
+        new = bool_or(Src[N], X)
+        new_size = count_true(new)
+        if new_size == src_size[N]:
+            return False
+        Src[N] = new
+        src_size[N] = new_size
+        return True
+
+    # a step is redone only if one of its inputs grew since its last run
+    seen = {}
+
+    def stale(key, inputs):
+        if seen.get(key) == inputs:
+            return False
+        seen[key] = inputs
+        return True
+
+    changed = True
+    iteration = 0
+    while changed:
+        changed = False
+        iteration += 1
+        for N in nonterms:
+            if src_size[N] and stale(N, src_size[N]):
+                changed |= grow(N, Src[N] @ E[N])
+                if N in eps:
+                    changed |= grow(N, Src[N])
+        for (B, C), heads in binary.items():
+            for A in heads:
+                if not src_size[A] or not stale((A, B, C), (src_size[A], size[B], size[C])):
+                    continue
+                changed |= demand(B, Src[A])
+                mid = Src[A] @ T[B]
+                ends = nonzero_columns(mid)
+                if len(ends):
+                    changed |= demand(C, bool_matrix_arrays(n, ends, ends))
+                    changed |= grow(A, mid @ T[C])
+        if found():
+            return True
+        if log:
+            print("iteration %d:" % iteration, {N: (src_size[N], size[N]) for N in sorted(nonterms)})
+    if target is not None:
+        return False
+    res = set()
+    if sp is not None and sp.issparse(T[start]):
+        rows, cols = T[start].nonzero()
+    else:
+        rows, cols = np.nonzero(T[start])
+    wanted = set(sources)
+    res.update((int(u), int(v)) for u, v in zip(rows, cols) if int(u) in wanted)
+    return res
+
+
+def cfpq_reaches(edges, n, G, s, t, start='S'):
+    # single-pair query: does s reach t by a path derived from start?
+    return cfpq_matrix_query(edges, n, G, [s], start, target=t)
+
+
+def matrix_facts(T):
+    # the set of (N, u, v) facts, comparable with Hellings.hellings()
+    res = set()
+    for N, m in T.items():
+        if sp is not None and sp.issparse(m):
+            rows, cols = m.nonzero()
+        else:
+            rows, cols = np.nonzero(m)
+        res.update((N, int(u), int(v)) for u, v in zip(rows, cols))
+    return res
+
+
+def cfpq_graph(graph, G, log=False, semi_naive=False, stats=None):
+    return cfpq_matrix(graph, graph.n, G, log, semi_naive, stats)
+
+
+def CYK_graph_matrix(M, G=None, log=True):
+    return cfpq_matrix(matrix_edges(M), len(M), G if G is not None else DEFAULT_GRAMMAR, log)
+
+
+def CYK_graph_query(M, sources, G=None, start='S', target=None, log=False):
+    # cfpq_matrix_query on a label matrix
+    return cfpq_matrix_query(matrix_edges(M), len(M), G if G is not None else DEFAULT_GRAMMAR,
+                             sources, start, target, log)
+
+
 if __name__ == '__main__':
     print("==========Test 1===========")
     graph1 = [
@@ -118,5 +401,8 @@ if __name__ == '__main__':
         ['0', '0', '0', '0', '0']
     ]
 
+    labels2 = copy.deepcopy(graph2) # CYK_graph overwrites the labels
     CYK_graph(graph2, G)
+    print("==========Test 2, matrix mode===========")
+    print(sorted(matrix_facts(CYK_graph_matrix(labels2, G))))
     
@@ -1,6 +1,8 @@
-# Note: if grammar has eps-rules, add loops on ititialization phase (TO DO)
+# Grammar is in CNF; eps-rules (rhs [] or ['eps']) give a loop (N, v, v) on every vertex
 
-import copy
+from collections import deque
+
+import graph_io
 
 G={
     'A':[['a']],
@@ -10,63 +12,190 @@ G={
     'E':[['B','C']],
     'S':[['D','E']]
  }
+DEFAULT_GRAMMAR = G
 
 
-def search_lhs_non_terminal_rule(first, second):
-    res = []
-    for k,v in G.items():
-        for item in v:
-            if [first,second] == item:
-                res.append(k)
-                #print("==rule found:", first, second,"<-",k)
-    return res
-
-
-def search_lhs_terminal_rule(term=None):
-    if not term:
-        return []
-    res = []
+def grammar_index(G):
+    # term -> [N] for N -> term, (B, C) -> [A] for A -> B C,
+    # and the nonterminals with eps-rules
+    terminal = {}
+    binary = {}
+    eps = []
     for k,v in G.items():
         for rhs_item in v:
-            if len(rhs_item) == 1:
-                if term == rhs_item[0]:
-                    res.append(k)
-    return res
+            if len(rhs_item) == 0 or rhs_item == ['eps']:
+                eps.append(k)
+            elif len(rhs_item) == 1:
+                terminal.setdefault(rhs_item[0], []).append(k)
+            else:
+                binary.setdefault((rhs_item[0], rhs_item[1]), []).append(k)
+    return terminal, binary, eps
 
 
-def hellings(M, G=None, log=True):
-    print("==========Hellings algorithm===========")
-    r = []
-    m = []
-
+def matrix_edges(M):
+    # (u, label, v) for the labelled adjacency matrix, '0' is no edge
     for i, row in enumerate(M):
         for j in range(len(row)):
-            nonterm_list = search_lhs_terminal_rule(M[i][j])
-            if len(nonterm_list) > 0:
-                for N in nonterm_list:
-                    r.append((N,i,j))
-    m += r
-
-    while len(m) > 0:
-        entry = m[0]
-        m = m[1:]
-        for r_item in r:
-            if r_item[2] == entry[1]:
-                ntr = search_lhs_non_terminal_rule(entry[0], r_item[0]) # try to concat right
-                if len(ntr) > 0:
-                    for n in ntr:
-                        m.append((n, r_item[1], entry[1]))
-                        r.append((n, r_item[1], entry[1]))
-        for r_item in r:
-            if r_item[2] == entry[1]:
-                ntr = search_lhs_non_terminal_rule(r_item[0], entry[0]) # try to concat left
-                if len(ntr) > 0:
-                    for n in ntr:
-                        m.append((n, entry[2], r_item[1]))
-                        r.append((n, entry[2], r_item[1]))
+            if M[i][j] and M[i][j] != '0':
+                yield i, M[i][j], j
+
+
+def hellings_edges(edges, n, G, log=False):
+    # Facts (N, u, v): there is a path u -> v whose word is derived from N.
+    # Every fact goes through the worklist once; it is joined only with the
+    # facts ending at u or starting at v (per-vertex indexes by nonterminal)
+    # and only along the rules with a matching body (grammar index by (B, C)).
+    terminal, binary, eps = grammar_index(G)
+    by_first = {} # B -> [(C, A)] for A -> B C
+    by_second = {} # C -> [(B, A)]
+    for (B, C), heads in binary.items():
+        for A in heads:
+            by_first.setdefault(B, []).append((C, A))
+            by_second.setdefault(C, []).append((B, A))
+
+    r = set()
+    m = deque()
+    ending = [{} for _ in range(n)] # ending[v][N]: the u with (N, u, v)
+    starting = [{} for _ in range(n)] # starting[u][N]: the v with (N, u, v)
+
+    def add(fact):
+        if fact not in r:
+            r.add(fact)
+            m.append(fact)
+            N, u, v = fact
+            starting[u].setdefault(N, []).append(v)
+            ending[v].setdefault(N, []).append(u)
+
+    for u, label, v in edges:
+        for N in terminal.get(label, ()):
+            add((N, u, v))
+    for N in eps:
+        for v in range(n):
+            add((N, v, v))
+
+    while m:
+        N, u, v = m.popleft()
+        for B, A in by_second.get(N, ()): # A -> B N: (B, w, u) + (N, u, v)
+            for w in ending[u].get(B, ()):
+                add((A, w, v))
+        for C, A in by_first.get(N, ()): # A -> N C: (N, u, v) + (C, v, w)
+            for w in starting[v].get(C, ()):
+                add((A, u, w))
+    if log:
+        print("facts:", len(r))
     return r
 
 
+def hellings_graph(graph, G, log=False):
+    # graph: graph_io.CSRGraph (or anything with .edges() and .n)
+    return hellings_edges(graph.edges(), graph.n, G, log)
+
+
+class _Found(Exception):
+    pass
+
+
+def hellings_query(graph, G, sources, start='S', target=None, log=False):
+    # Demand-driven Hellings: only facts (N, u, v) whose start u is demanded
+    # are derived. (start, s) is demanded for every source s; a demanded (A, u)
+    # with A -> B C demands (B, u), and every fact (B, u, w) found then
+    # demands (C, w). Terminal facts come from the out-edges of demanded
+    # vertices only. Returns the set of (s, v) with (start, s, v); with
+    # target set, returns True as soon as some (start, s, target) is derived,
+    # False otherwise.
+    # graph: graph_io.CSRGraph or a dense label matrix.
+    if isinstance(graph, list):
+        graph = graph_io.CSRGraph.from_matrix(graph)
+    terminal, binary, eps = grammar_index(G)
+    labels_of = {} # A -> label ids a with A -> a
+    for label, heads in terminal.items():
+        a = graph.label_id.get(label)
+        if a is not None:
+            for A in heads:
+                labels_of.setdefault(A, set()).add(a)
+    rules_of = {} # A -> [(B, C)]
+    for (B, C), heads in binary.items():
+        for A in heads:
+            rules_of.setdefault(A, []).append((B, C))
+    eps = set(eps)
+    sources = set(sources)
+
+    facts = set()
+    starting = {} # (N, u) -> the v with (N, u, v)
+    demanded = set()
+    first_waits = {} # (B, u) -> {(A, C)}: A -> B C is demanded at u
+    second_waits = {} # (C, w) -> {(A, u)}: (B, u, w) is known, (C, w, v) gives (A, u, v)
+    m = deque()
+    demands = deque()
+
+    def add(N, u, v):
+        if (N, u, v) not in facts:
+            facts.add((N, u, v))
+            starting.setdefault((N, u), []).append(v)
+            m.append((N, u, v))
+            if target is not None and N == start and v == target and u in sources:
+                raise _Found()
+
+    def demand(N, u):
+        if (N, u) not in demanded:
+            demanded.add((N, u))
+            demands.append((N, u))
+
+    def join_first(A, u, C, w):
+        # (B, u, w) for A -> B C demanded at u: wait for (C, w, v)
+        if (A, u) not in second_waits.setdefault((C, w), set()):
+            second_waits[(C, w)].add((A, u))
+            demand(C, w)
+            for v in list(starting.get((C, w), ())):
+                add(A, u, v)
+
+    try:
+        for s in sources:
+            demand(start, s)
+        while demands or m:
+            while demands:
+                A, u = demands.popleft()
+                labels = labels_of.get(A)
+                if labels:
+                    for a, v in graph.out_edges(u):
+                        if a in labels:
+                            add(A, u, v)
+                if A in eps:
+                    add(A, u, u)
+                for B, C in rules_of.get(A, ()):
+                    if (A, C) not in first_waits.setdefault((B, u), set()):
+                        first_waits[(B, u)].add((A, C))
+                        demand(B, u)
+                        for w in list(starting.get((B, u), ())):
+                            join_first(A, u, C, w)
+            if m:
+                N, u, v = m.popleft()
+                for A, C in list(first_waits.get((N, u), ())):
+                    join_first(A, u, C, v)
+                for A, u2 in list(second_waits.get((N, u), ())):
+                    add(A, u2, v)
+    except _Found:
+        if log:
+            print("facts:", len(facts), "demands:", len(demanded))
+        return True
+    if log:
+        print("facts:", len(facts), "demands:", len(demanded))
+    if target is not None:
+        return False
+    return {(s, v) for s in sources for v in starting.get((start, s), ())}
+
+
+def hellings_reaches(graph, G, s, t, start='S'):
+    # single-pair query: does s reach t by a path derived from start?
+    return hellings_query(graph, G, [s], start, target=t)
+
+
+def hellings(M, G=None, log=True):
+    if log:
+        print("==========Hellings algorithm===========")
+    return hellings_edges(matrix_edges(M), len(M), G if G is not None else DEFAULT_GRAMMAR, log)
+
+
 if __name__ == '__main__':
     print("==========Test 1===========")
 
@@ -78,7 +207,7 @@ if __name__ == '__main__':
         ['0', '0', '0', '0', '0'],
     ]
 
-    print(hellings(graph1, G))
+    print(sorted(hellings(graph1, G)))
 
     print("==========Test 2===========")
     graph2 = [
@@ -88,4 +217,4 @@ if __name__ == '__main__':
         ['0', '0', '0', 'c', 'c'],
         ['0', '0', '0', '0', '0']
     ]
-    print(hellings(graph2,G))
+    print(sorted(hellings(graph2,G)))
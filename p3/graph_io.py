@@ -0,0 +1,220 @@
+import gzip
+import mmap
+import struct
+import sys
+from array import array
+
+# Labelled graphs for CFPQ without the dense n x n label matrix: edge-list
+# loaders (TSV/CSV/whitespace, optionally .gz, one "source target label" edge
+# per line, '#' starts a comment) and a compressed-sparse-row graph with
+# interned vertex and label names. Memory is proportional to the edges.
+#
+# Binary container (.csr), all integers little-endian int32:
+#   header   magic, n vertices, m edges, k labels, names size
+#   indptr   int32[n+1], the out-edges of u are edges indptr[u]..indptr[u+1]-1
+#   targets  int32[m]
+#   labels   int32[m] label ids
+#   names    int32[n+k+1] offsets into the blob, then the utf-8 blob of
+#            the vertex names followed by the label names
+CSR_MAGIC = b'CSR1'
+CSR_SUFFIX = '.csr'
+_csr_header = struct.Struct('<4sIIII')
+
+
+def _int32_array(items):
+    res = array('i', items)
+    if sys.byteorder == 'big':
+        res.byteswap()
+    return res
+
+
+class Interner(object):
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def __call__(self, name):
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+
+class CSRGraph(object):
+    """
+    Edges sorted by source: the out-edges of u are targets[indptr[u]:indptr[u+1]]
+    with labels edge_labels[...] (label ids). The arrays are array('i') or,
+    for a graph loaded with load_csr(), zero-copy views of the mapped file.
+    """
+    def __init__(self, vertices, labels, indptr, targets, edge_labels):
+        self.vertices = vertices
+        self.labels = labels
+        self.vertex_id = {name: i for i, name in enumerate(vertices)}
+        self.label_id = {name: i for i, name in enumerate(labels)}
+        self.indptr = indptr
+        self.targets = targets
+        self.edge_labels = edge_labels
+
+    @property
+    def n(self):
+        return len(self.vertices)
+
+    def __len__(self):
+        return len(self.targets)
+
+    @classmethod
+    def from_edges(cls, edges):
+        # edges: (source name, target name, label name) triples
+        vertex = Interner()
+        label = Interner()
+        src = array('i')
+        dst = array('i')
+        lab = array('i')
+        for u, v, a in edges:
+            src.append(vertex(u))
+            dst.append(vertex(v))
+            lab.append(label(a))
+        return cls.from_arrays(vertex.names, label.names, src, dst, lab)
+
+    @classmethod
+    def from_arrays(cls, vertices, labels, src, dst, lab):
+        # counting sort of the edges by source
+        n = len(vertices)
+        indptr = array('i', [0]) * (n + 1)
+        for u in src:
+            indptr[u + 1] += 1
+        for u in range(n):
+            indptr[u + 1] += indptr[u]
+        pos = array('i', indptr[:n])
+        targets = array('i', [0]) * len(src)
+        edge_labels = array('i', [0]) * len(src)
+        for i, u in enumerate(src):
+            j = pos[u]
+            targets[j] = dst[i]
+            edge_labels[j] = lab[i]
+            pos[u] = j + 1
+        return cls(vertices, labels, indptr, targets, edge_labels)
+
+    @classmethod
+    def from_matrix(cls, M):
+        # the dense label matrix used by Hellings.py / CYK_graph_naive.py,
+        # vertex i keeps id i (named str(i))
+        label = Interner()
+        src = array('i')
+        dst = array('i')
+        lab = array('i')
+        for i, row in enumerate(M):
+            for j in range(len(row)):
+                if M[i][j] and M[i][j] != '0':
+                    src.append(i)
+                    dst.append(j)
+                    lab.append(label(M[i][j]))
+        return cls.from_arrays([str(i) for i in range(len(M))], label.names, src, dst, lab)
+
+    def out_edges(self, u):
+        # (label id, target) pairs
+        for i in range(self.indptr[u], self.indptr[u + 1]):
+            yield self.edge_labels[i], self.targets[i]
+
+    def edges(self):
+        # (u, label name, v), the input format of hellings_edges / cfpq_matrix
+        labels = self.labels
+        targets = self.targets
+        edge_labels = self.edge_labels
+        indptr = self.indptr
+        for u in range(self.n):
+            for i in range(indptr[u], indptr[u + 1]):
+                yield u, labels[edge_labels[i]], targets[i]
+
+
+def open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def read_edges(path, delimiter=None):
+    # (source, target, label) name triples of a .tsv/.csv/.txt file (or the
+    # same + .gz); the delimiter defaults to tab for .tsv, comma for .csv and
+    # any whitespace otherwise
+    base = path[:-3] if path.endswith('.gz') else path
+    if delimiter is None:
+        delimiter = '\t' if base.endswith('.tsv') else ',' if base.endswith('.csv') else None
+    with open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [x.strip() for x in line.split(delimiter)]
+            if len(parts) != 3:
+                raise ValueError("%s: expected 'source target label', got %r" % (path, line))
+            yield parts[0], parts[1], parts[2]
+
+
+def load_edges(path, delimiter=None):
+    return CSRGraph.from_edges(read_edges(path, delimiter))
+
+
+def save_csr(graph, path):
+    encoded = [name.encode('utf-8') for name in list(graph.vertices) + list(graph.labels)]
+    offsets = [0]
+    for name in encoded:
+        offsets.append(offsets[-1] + len(name))
+    with open(path, 'wb') as f:
+        f.write(_csr_header.pack(CSR_MAGIC, graph.n, len(graph), len(graph.labels), offsets[-1]))
+        f.write(_int32_array(graph.indptr).tobytes())
+        f.write(_int32_array(graph.targets).tobytes())
+        f.write(_int32_array(graph.edge_labels).tobytes())
+        f.write(_int32_array(offsets).tobytes())
+        f.write(b''.join(encoded))
+
+
+def load_csr(path):
+    # The file is mapped read-only and the arrays are memoryviews into it
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, n, m, k, names_size = _csr_header.unpack_from(mm, 0)
+    if magic != CSR_MAGIC:
+        raise ValueError("%s is not a .csr file" % path)
+    view = memoryview(mm)
+
+    def int32_view(offset, count):
+        ints = view[offset:offset + 4 * count].cast('i')
+        if sys.byteorder == 'big':
+            ints = array('i', ints)
+            ints.byteswap()
+        return ints
+
+    pos = _csr_header.size
+    indptr = int32_view(pos, n + 1)
+    pos += 4 * (n + 1)
+    targets = int32_view(pos, m)
+    pos += 4 * m
+    edge_labels = int32_view(pos, m)
+    pos += 4 * m
+    offsets = int32_view(pos, n + k + 1)
+    pos += 4 * (n + k + 1)
+    names = [str(mm[pos + offsets[i]:pos + offsets[i + 1]], 'utf-8') for i in range(n + k)]
+    graph = CSRGraph(names[:n], names[n:], indptr, targets, edge_labels)
+    graph._mmap = mm # keep the mapping alive as long as the views are
+    return graph
+
+
+def load_graph(path, delimiter=None):
+    # .csr files are mapped, anything else is read as an edge list
+    with open(path, 'rb') as f:
+        if f.read(len(CSR_MAGIC)) == CSR_MAGIC:
+            return load_csr(path)
+    return load_edges(path, delimiter)
+
+
+if __name__ == '__main__':
+    # usage: graph_io.py <edges.tsv|edges.csv|edges.txt[.gz]|graph.csr> [out.csr]
+    if len(sys.argv) <= 1:
+        print("Input is incorrect")
+        sys.exit(1)
+    graph = load_graph(sys.argv[1])
+    print("vertices: %d, edges: %d, labels: %d" % (graph.n, len(graph), len(graph.labels)))
+    if len(sys.argv) > 2:
+        save_csr(graph, sys.argv[2])